@@ -0,0 +1,36 @@
+"""book rating rollup
+
+Revision ID: 7c3e91a4b2d0
+Revises: 1e9259a3751f
+Create Date: 2026-10-17 12:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e91a4b2d0'
+down_revision: Union[str, None] = '1e9259a3751f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Add the rollup columns, then backfill them from the existing reviews
+    op.add_column('books', sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False))
+    op.add_column('books', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE books SET
+            rating_sum = COALESCE((SELECT SUM(rating) FROM reviews WHERE reviews.book_id = books.id), 0),
+            rating_count = (SELECT COUNT(id) FROM reviews WHERE reviews.book_id = books.id)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('books', 'rating_count')
+    op.drop_column('books', 'rating_sum')
@@ -0,0 +1,31 @@
+"""token expiry
+
+Revision ID: 9d41f0c6e8b3
+Revises: 7c3e91a4b2d0
+Create Date: 2026-10-17 14:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41f0c6e8b3'
+down_revision: Union[str, None] = '7c3e91a4b2d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_tokens_expires_at'), 'tokens', ['expires_at'], unique=False)
+    # Existing tokens were issued with the default 30 minute lifetime, so none of them
+    # outlives this bound; the sweeper removes them once it passes
+    op.execute("UPDATE tokens SET expires_at = (now() at time zone 'utc') + interval '30 minutes'")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tokens_expires_at'), table_name='tokens')
+    op.drop_column('tokens', 'expires_at')
@@ -0,0 +1,32 @@
+"""catalog revision
+
+Revision ID: a3c9e5f1b702
+Revises: f7a9d2e41c08
+Create Date: 2026-10-17 21:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9e5f1b702'
+down_revision: Union[str, None] = 'f7a9d2e41c08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'catalog_revision',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('catalog', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute("INSERT INTO catalog_revision (id, catalog) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('catalog_revision')
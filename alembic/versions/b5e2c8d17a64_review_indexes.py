@@ -0,0 +1,28 @@
+"""review indexes
+
+Revision ID: b5e2c8d17a64
+Revises: 9d41f0c6e8b3
+Create Date: 2026-10-17 15:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e2c8d17a64'
+down_revision: Union[str, None] = '9d41f0c6e8b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_reviews_book_id_id', 'reviews', ['book_id', 'id'], unique=False)
+    op.create_index(op.f('ix_reviews_user_id'), 'reviews', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_reviews_user_id'), table_name='reviews')
+    op.drop_index('ix_reviews_book_id_id', table_name='reviews')
@@ -0,0 +1,57 @@
+"""book search vector
+
+Revision ID: d8f3a5b9c217
+Revises: b5e2c8d17a64
+Create Date: 2026-10-17 17:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3a5b9c217'
+down_revision: Union[str, None] = 'b5e2c8d17a64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}author, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}genre, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}summary, '')), 'C')
+"""
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_DOCUMENT.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER books_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF title, author, genre, summary ON books
+            FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+        """
+    )
+    # Backfill existing books, then index
+    op.execute(f"UPDATE books SET search_vector = {SEARCH_DOCUMENT.format(row='')}")
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_search_vector', table_name='books')
+    op.execute("DROP TRIGGER IF EXISTS books_search_vector_trigger ON books")
+    op.execute("DROP FUNCTION IF EXISTS books_search_vector_update()")
+    op.drop_column('books', 'search_vector')
@@ -0,0 +1,26 @@
+"""book year index
+
+Revision ID: e2b6c0d4f915
+Revises: d8f3a5b9c217
+Create Date: 2026-10-17 18:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b6c0d4f915'
+down_revision: Union[str, None] = 'd8f3a5b9c217'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_books_year_published'), 'books', ['year_published'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_books_year_published'), table_name='books')
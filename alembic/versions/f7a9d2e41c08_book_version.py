@@ -0,0 +1,26 @@
+"""book version
+
+Revision ID: f7a9d2e41c08
+Revises: e2b6c0d4f915
+Create Date: 2026-10-17 19:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a9d2e41c08'
+down_revision: Union[str, None] = 'e2b6c0d4f915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('books', 'version')
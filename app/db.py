@@ -1,8 +1,15 @@
 import os
 import sys
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
+from app.utils.cache import TTLCache
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
@@ -12,21 +19,185 @@ load_dotenv()
 
 # Retrieve environment variables
 DATABASE_URL = os.environ.get("DATABASE_URL")
-# Create the database engine
+# Optional read replica for read-only routes; reads go to the primary when unset
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+# After a user's own write, their reads stay on the primary for this long
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", 5))
+
+# Engine and pool settings
+DB_ECHO = os.environ.get("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 500))
+
+
+class PoolMetrics:
+    """Counters for connection checkouts and the time spent waiting for a pooled connection."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "wait_seconds_mean": self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited (including opening new connections)."""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.observe_wait(time.perf_counter() - start)
+
+
+def create_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    """
+    Create an async engine configured from the DB_* environment settings.
+    Keyword arguments override individual create_async_engine() options.
+    """
+    parsed = make_url(url)
+    options = {"echo": DB_ECHO}
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        metrics = PoolMetrics()
+        options.update(
+            poolclass=type("InstrumentedPool", (InstrumentedPool,), {"metrics": metrics}),
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    if parsed.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    options.update(overrides)
+    return create_async_engine(url, **options)
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    """Current pool occupancy plus checkout/wait metrics of an engine created by create_engine()."""
+    pool = engine.sync_engine.pool
+    stats = {"status": pool.status()}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    if isinstance(pool, InstrumentedPool):
+        stats.update(pool.metrics.stats())
+    return stats
 
-print("Connecting to database:", DATABASE_URL)  # Debugging
 
 # Define the Base class
 Base = declarative_base()
 
-# Create asynchronous engine
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+# Create asynchronous engines
+engine = create_engine(DATABASE_URL)
+replica_engine = create_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else engine
+
+
+class PrimarySession(Session):
+    """Sync session class behind primary AsyncSessions; commits mark the user for read-your-writes."""
+
+
+# user id -> True while the user's reads must stay on the primary (this worker only)
+recent_writers = TTLCache(maxsize=100000, ttl=READ_YOUR_WRITES_SECONDS)
 
-# Create an async session factory
-AsyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+# Cookie holding the time of the client's last write, so that every worker (not only the
+# one that handled the write) keeps the client's reads on the primary for a while
+LAST_WRITE_COOKIE = "last_write"
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def remember_writer(session):
+    request = session.info.get("request")
+    if request is None:
+        return
+    request.state.last_write = time.time()
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is not None:
+        recent_writers.set(user_id, True)
+
+
+def last_write_time(request: Request) -> Optional[float]:
+    """Time of the client's last write according to its LAST_WRITE_COOKIE, if it sent one."""
+    try:
+        return float(request.cookies[LAST_WRITE_COOKIE])
+    except (KeyError, ValueError):
+        return None
+
+
+def reads_from_primary(user_id: Optional[int], last_write: Optional[float] = None) -> bool:
+    """True when there is no replica or the client wrote within READ_YOUR_WRITES_SECONDS."""
+    if replica_engine is engine:
+        return True
+    if last_write is not None and time.time() - last_write < READ_YOUR_WRITES_SECONDS:
+        return True
+    return user_id is not None and recent_writers.get(user_id) is not None
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware setting LAST_WRITE_COOKIE on responses to requests that committed a write."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or replica_engine is engine:
+            return await self.app(scope, receive, send)
+        # Shared with request.state, where remember_writer() records the write
+        state = scope.setdefault("state", {})
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and "last_write" in state:
+                cookie = (
+                    f"{LAST_WRITE_COOKIE}={state['last_write']:.3f}; Max-Age={max(1, round(READ_YOUR_WRITES_SECONDS))}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+# Create async session factories
+AsyncSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=AsyncSession, sync_session_class=PrimarySession
+)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, class_=AsyncSession)
 
 # Dependency to get the async database session
-async def get_db():
+async def get_db(request: Request):
     async with AsyncSessionLocal() as session:
+        session.info["request"] = request
+        yield session
+        await session.close()
+
+# Dependency to get a session for read-only routes: the replica, unless the caller
+# wrote recently. List it after JWTBearer so request.state.user_id is already set.
+async def get_read_db(request: Request):
+    user_id = getattr(request.state, "user_id", None)
+    session_factory = AsyncSessionLocal if reads_from_primary(user_id, last_write_time(request)) else ReadSessionLocal
+    async with session_factory() as session:
         yield session
         await session.close()
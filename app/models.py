@@ -1,5 +1,7 @@
-from sqlalchemy import Column, String, Boolean, Text, ForeignKey, Integer, Float, UUID, Identity
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Boolean, Text, ForeignKey, Integer, Float, UUID, Identity, DateTime, Index
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from app.db import Base
 
 
@@ -20,6 +22,7 @@ class Token(Base):
     id = Column(Integer, Identity(start=1), primary_key=True, index=True)
     token = Column(String, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    expires_at = Column(DateTime, index=True)  # UTC expiry, used to purge expired rows
 
     # Relationship to User model
     user = relationship("User", back_populates="tokens")
@@ -32,22 +35,78 @@ class Book(Base):
     title = Column(String(255), index=True)
     author = Column(String(255), index=True)
     genre = Column(String(100), index=True)
-    year_published = Column(Integer)
+    year_published = Column(Integer, index=True)
     summary = Column(Text)
 
+    # Denormalized rating rollup, maintained incrementally when reviews are added
+    rating_sum = Column(Float, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Incremented by every change to the book or its reviews; book response ETags derive from it
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Full-text search document over title, author, genre and summary, maintained by the
+    # books_search_vector_update trigger on Postgres (unused elsewhere); never loaded with the book
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite")))
+
+    __table_args__ = (
+        Index('ix_books_search_vector', 'search_vector', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
     # Relationship to the Review model
     reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
 
 
+# Keep books.search_vector current; the same function and trigger are created by migration
+BOOKS_SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.author, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.genre, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.summary, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+BOOKS_SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER books_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, author, genre, summary ON books
+    FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+"""
+
+for statement in (BOOKS_SEARCH_VECTOR_FUNCTION, BOOKS_SEARCH_VECTOR_TRIGGER):
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+# Single-row table (id 1) holding the database-wide catalog revision; book writes bump it
+# in their own transaction, so every worker sees the same value
+class CatalogRevision(Base):
+    __tablename__ = 'catalog_revision'
+    id = Column(Integer, primary_key=True)
+    catalog = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+event.listen(
+    CatalogRevision.__table__, "after_create",
+    DDL("INSERT INTO catalog_revision (id, catalog) VALUES (1, 0)"),
+)
+
+
 # Review model
 class Review(Base):
     __tablename__ = 'reviews'
     id = Column(Integer, Identity(start=1), primary_key=True, index=True)
     book_id = Column(Integer, ForeignKey('books.id', ondelete='CASCADE'))
-    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))  # Foreign key to User's id field
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)  # Foreign key to User's id field
     review_text = Column(Text)
     rating = Column(Float)
 
+    # Serves the per-book review listing, which filters on book_id and pages by id
+    __table_args__ = (Index('ix_reviews_book_id_id', 'book_id', 'id'),)
+
     # Relationship to the Book model
     book = relationship("Book", back_populates="reviews")
 
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.db import get_db
-from app.utils.auth import create_access_token
-from app.utils.password import secure_pwd, verify_pwd
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.utils.auth import create_access_token, revoke_token, JWTBearer
+from app.utils.password import password_hasher
 from app.models import User
 from app.schemas import GetUser, PostUser, LoginUser
 from typing import Optional
@@ -25,7 +26,7 @@ async def register_user(payload: PostUser, db: AsyncSession = Depends(get_db)):
     if user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = secure_pwd(payload.password)  # Hashing password
+    hashed_password = await password_hasher.hash(payload.password)  # Hashing password off the event loop
     new_user = User(email=payload.email, hashed_password=hashed_password)
     db.add(new_user)
     await db.commit()  # Commit asynchronously
@@ -44,9 +45,20 @@ async def login_user(payload: LoginUser, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.email == payload.email))
     user = result.scalar_one_or_none()
     
-    if not user or not verify_pwd(payload.password, user.hashed_password):
+    if not user or not await password_hasher.verify(payload.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     # Generate access token asynchronously
     access_token = await create_access_token(subject=user.id, db=db)
     return {"access_token": access_token, "token_type": "bearer"}
+
+# Logout User (revokes the presented access token)
+@router.post("/logout", dependencies=[Depends(JWTBearer())])
+async def logout_user(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Endpoint for user logout.
+    - Deletes the access token from the database and evicts it from the token cache.
+    """
+    credentials: HTTPAuthorizationCredentials = await HTTPBearer()(request)
+    await revoke_token(credentials.credentials, db)
+    return {"message": "Logged out successfully"}
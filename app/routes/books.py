@@ -1,55 +1,267 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
 from sqlalchemy.future import select
+from pydantic import TypeAdapter
 from app.models import Book, Review
-from app.schemas import BookCreate, BookUpdate, BookOut,Recommendation
+from app.schemas import BookCreate, BookUpdate, BookOut, BookFacets, Recommendation
 from app.utils.auth import JWTBearer
-from typing import List
-from app.db import get_db
+from typing import List, Optional
+from app.db import get_db, get_read_db
 from app.utils.helper import *
+from app.utils.summary_jobs import jobs, save_upload, stream_summary_events, submit_summary_job
+from app.utils.embeddings import RECOMMENDATION_CANDIDATES, book_document, book_index
+from app.utils.catalog import bump_catalog_revision, bump_stored_catalog_revision, catalog_revision, rating_revision
+from app.utils.fast_json import FAST_JSON, rows_to_json
+from app.utils.response_cache import CachedResponse, cached_json_response, make_etag, response_cache
+from app.utils.search import search_books, search_index
+from app.utils.facets import book_facets
+from app.utils.recommendations import cached_recommendations
+from app.utils.bulk_import import BULK_IMPORT_BATCH_SIZE, MAX_BULK_IMPORT_BATCH_SIZE, import_books
+import json
 import os
 router = APIRouter()
 
+# Page size limits for the book listing
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Read average ratings from the rating rollup columns on books instead of aggregating reviews
+RATING_ROLLUP = os.environ.get("RATING_ROLLUP", "false").lower() == "true"
+
+# Columns served by the book listing; the summary Text column is only added on request
+BOOK_LIST_COLUMNS = (Book.id, Book.title, Book.author, Book.genre, Book.year_published)
+
+BOOK_LIST_ADAPTER = TypeAdapter(List[BookOut])
+BOOK_FIELDS = tuple(BookOut.model_fields)
+
+
+def serialize_books(rows) -> bytes:
+    """JSON body of a book listing, as the List[BookOut] response model would render it."""
+    if FAST_JSON:
+        return rows_to_json(rows, BOOK_FIELDS)
+    return BOOK_LIST_ADAPTER.dump_json(BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True))
+
+
+async def stream_rows_as_ndjson(db: AsyncSession, query):
+    """Yield one JSON line per row, reading rows from a server-side cursor."""
+    result = await db.stream(query)
+    async for row in result:
+        yield json.dumps(dict(row._mapping)) + "\n"
+
 # Add a new book (Authenticated)
 @router.post("/books/", response_model=BookOut, tags=["Books"], dependencies=[Depends(JWTBearer())])
 async def create_book(
     book: BookCreate, 
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db), 
     user_id: int = Depends(JWTBearer())
 ):
     new_book = Book(**book.dict())
     db.add(new_book)
+    await bump_stored_catalog_revision(db)
     await db.commit()
     await db.refresh(new_book)
+    bump_catalog_revision()
+    search_index.upsert(new_book)
+    background_tasks.add_task(book_index.upsert, new_book.id, book_document(new_book))
     return new_book
 
-# Retrieve all books (Authenticated)
+# Bulk import books from NDJSON or CSV (Authenticated)
+@router.post("/books/import", tags=["Books"], dependencies=[Depends(JWTBearer())])
+async def bulk_import_books(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(BULK_IMPORT_BATCH_SIZE, ge=1, le=MAX_BULK_IMPORT_BATCH_SIZE),
+    copy: bool = False,
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(JWTBearer())
+):
+    """
+    Streams BookCreate records from the request body into the catalog in batches.
+    - `format` defaults to csv for a text/csv body and ndjson otherwise; CSV needs a header row.
+    - Each batch is validated and inserted in its own transaction; invalid lines are skipped
+      and reported per batch with their line number.
+    - `copy=true` uses COPY on PostgreSQL.
+    """
+    if format is None:
+        format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    report = await import_books(db, request.stream(), format, batch_size, copy)
+    if report["inserted"]:
+        bump_catalog_revision()
+        book_index.invalidate()
+        search_index.invalidate()
+    return report
+
+def parse_ids(ids: str) -> List[int]:
+    """Parse a comma-separated id list, keeping the first occurrence of each id."""
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    parsed = list(dict.fromkeys(parsed))
+    if len(parsed) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids can be requested at once")
+    return parsed
+
+# Retrieve books page by page, or many books by id (Authenticated)
 @router.get("/books/", response_model=List[BookOut], tags=["Books"], dependencies=[Depends(JWTBearer())])
+@router.get("/books", response_model=List[BookOut], tags=["Books"], dependencies=[Depends(JWTBearer())], include_in_schema=False)
 async def get_books(
-    db: AsyncSession = Depends(get_db), 
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    ids: Optional[str] = Query(None, description="Comma-separated book ids to fetch in one query"),
+    include_summary: bool = True,
+    stream: bool = False,
+    genre: Optional[str] = None,
+    author: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    db: AsyncSession = Depends(get_read_db), 
     user_id: int = Depends(JWTBearer())
 ):
-    result = await db.execute(select(Book))
-    books = result.scalars().all()
+    """
+    Keyset-paginated book listing ordered by id.
+    - Returns at most `limit` books with an id greater than `after`.
+    - `genre` and `author` match exactly; `year_from`/`year_to` bound the publication year
+      (inclusive); `min_rating` keeps books whose average review rating is at least that.
+    - Sets the `X-Next-Cursor` header when more books are available.
+    - `include_summary=false` leaves the summary column out of the query.
+    - `stream=true` returns NDJSON rows as they are read instead of a JSON list;
+      without `limit` it streams every book after the cursor.
+    - `ids=1,2,3` fetches those books with a single IN query, in the requested order
+      (duplicates collapsed). Unknown ids are not an error: they are left out of the
+      body and listed in the `X-Missing-Ids` header.
+    - Responses are cached per catalog revision (and rating revision when filtering on
+      `min_rating`) of this worker and carry an ETag hashed from the response itself, so it
+      means the same on every worker; `If-None-Match` with it answers 304.
+    """
+    columns = BOOK_LIST_COLUMNS + ((Book.summary,) if include_summary else ())
+    # `ids` lookups are small and never streamed
+    if not stream or ids is not None:
+        cache_key = (
+            "books",
+            catalog_revision(),
+            rating_revision() if min_rating is not None else None,
+            tuple(sorted(request.query_params.multi_items())),
+        )
+        entry = response_cache.get(cache_key)
+        if entry is None:
+            books, headers = await list_books(db, columns, limit, after, ids, genre, author, year_from, year_to, min_rating)
+            body = serialize_books(books)
+            etag = make_etag("books", body, sorted(headers.items()))
+            entry = response_cache.store(cache_key, CachedResponse(etag, body, headers))
+        return cached_json_response(request, entry)
+
+    query = filtered_books_query(columns, after, genre, author, year_from, year_to, min_rating)
+    if limit is not None:
+        query = query.limit(limit)
+    return StreamingResponse(stream_rows_as_ndjson(db, query), media_type="application/x-ndjson")
+
+
+def filtered_books_query(columns, after, genre, author, year_from, year_to, min_rating):
+    """Listing query ordered by id, starting after the `after` cursor, with the optional filters applied."""
+    query = select(*columns).order_by(Book.id)
+    if after is not None:
+        query = query.where(Book.id > after)
+    if genre is not None:
+        query = query.where(Book.genre == genre)
+    if author is not None:
+        query = query.where(Book.author == author)
+    if year_from is not None:
+        query = query.where(Book.year_published >= year_from)
+    if year_to is not None:
+        query = query.where(Book.year_published <= year_to)
+    if min_rating is not None:
+        # Compare against the rating rollup without dividing: sum >= min * count
+        query = query.where(Book.rating_count > 0, Book.rating_sum >= min_rating * Book.rating_count)
+    return query
+
+
+async def list_books(db: AsyncSession, columns, limit, after, ids, genre, author, year_from, year_to, min_rating) -> tuple:
+    """Rows of one page of the book listing (or of the requested ids) and the headers that go with them."""
+    if ids is not None:
+        requested = parse_ids(ids)
+        result = await db.execute(select(*columns).where(Book.id.in_(requested)))
+        found = {book.id: book for book in result.all()}
+        missing = [book_id for book_id in requested if book_id not in found]
+        headers = {"X-Missing-Ids": ",".join(str(book_id) for book_id in missing)} if missing else {}
+        return [found[book_id] for book_id in requested if book_id in found], headers
+
+    query = filtered_books_query(columns, after, genre, author, year_from, year_to, min_rating)
+    limit = limit or DEFAULT_PAGE_SIZE
+    # Fetch one extra row to find out whether there is a next page
+    result = await db.execute(query.limit(limit + 1))
+    books = result.all()
+    if len(books) > limit:
+        return books[:limit], {"X-Next-Cursor": str(books[limit - 1].id)}
+    return books, {}
+
+# Book counts per genre and decade for filter sidebars (Authenticated)
+# Registered before /books/{id} so that "facets" is not parsed as a book id
+@router.get("/books/facets", response_model=BookFacets, tags=["Books"], dependencies=[Depends(JWTBearer())])
+async def get_book_facets(
+    db: AsyncSession = Depends(get_read_db),
+    user_id: int = Depends(JWTBearer())
+):
+    return await book_facets(db)
+
+# Full-text search over title, author, genre and summary (Authenticated)
+# Registered before /books/{id} so that "search" is not parsed as a book id
+@router.get("/books/search", response_model=List[BookOut], tags=["Books"], dependencies=[Depends(JWTBearer())])
+async def search_catalog(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, ge=0, description="Cursor from the X-Next-Cursor header of the previous page"),
+    include_summary: bool = True,
+    db: AsyncSession = Depends(get_read_db),
+    user_id: int = Depends(JWTBearer())
+):
+    """
+    Books matching every word of `q`, best match first (title and author weigh most, then genre, then summary).
+    - Returns at most `limit` books and sets the `X-Next-Cursor` header when more matches are available.
+    - `include_summary=false` leaves the summary column out of the query.
+    """
+    columns = BOOK_LIST_COLUMNS + ((Book.summary,) if include_summary else ())
+    offset = cursor or 0
+    # Fetch one extra row to find out whether there is a next page
+    books = await search_books(db, q, columns, limit + 1, offset)
+    if len(books) > limit:
+        books = books[:limit]
+        response.headers["X-Next-Cursor"] = str(offset + limit)
     return books
 
 # Retrieve a specific book by ID (Authenticated)
 @router.get("/books/{id}", response_model=BookOut, tags=["Books"], dependencies=[Depends(JWTBearer())])
 async def get_book(
     id: int, 
-    db: AsyncSession = Depends(get_db), 
+    request: Request,
+    db: AsyncSession = Depends(get_read_db), 
     user_id: int = Depends(JWTBearer())
 ):
-    book = await db.get(Book, id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    return book
+    """Returns the book; the ETag follows its version column and `If-None-Match` with it answers 304."""
+    entry = response_cache.get(("book", id))
+    if entry is None:
+        generation = response_cache.generation(id)
+        book = await db.get(Book, id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        body = BookOut.model_validate(book).model_dump_json().encode()
+        entry = CachedResponse(make_etag("book", id, book.version), body, {})
+        entry = response_cache.store(("book", id), entry, book_id=id, generation=generation)
+    return cached_json_response(request, entry)
 
 # Update a book's information by ID (Authenticated)
 @router.put("/books/{id}", response_model=BookOut, tags=["Books"], dependencies=[Depends(JWTBearer())])
 async def update_book(
     id: int, 
     book_update: BookUpdate, 
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db), 
     user_id: int = Depends(JWTBearer())
 ):
@@ -58,8 +270,14 @@ async def update_book(
         raise HTTPException(status_code=404, detail="Book not found")
     for key, value in book_update.dict(exclude_unset=True).items():
         setattr(book, key, value)
+    book.version = Book.version + 1
+    await bump_stored_catalog_revision(db)
     await db.commit()
     await db.refresh(book)
+    response_cache.invalidate_book(id)
+    bump_catalog_revision()
+    search_index.upsert(book)
+    background_tasks.add_task(book_index.upsert, book.id, book_document(book))
     return book
 
 # Delete a book by ID (Authenticated)
@@ -73,7 +291,12 @@ async def delete_book(
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     await db.delete(book)
+    await bump_stored_catalog_revision(db)
     await db.commit()
+    response_cache.invalidate_book(id)
+    bump_catalog_revision()
+    book_index.remove(id)
+    search_index.remove(id)
     return {"message": "Book deleted successfully"}
 
 
@@ -81,63 +304,107 @@ async def delete_book(
 @router.get("/books/{id}/summary", tags=["Books"], dependencies=[Depends(JWTBearer())])
 async def get_summary(
     id: int, 
-    db: AsyncSession = Depends(get_db), 
+    request: Request,
+    db: AsyncSession = Depends(get_read_db), 
     user_id: int = Depends(JWTBearer())
 ):
-    book = await db.get(Book, id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    result = await db.execute(select(Review).filter(Review.book_id == id))
-    reviews = result.scalars().all()
+    """
+    Returns the book summary with its average rating and review count.
+    - With RATING_ROLLUP enabled this is a primary-key read of the rollup columns.
+    - Otherwise the average is aggregated in SQL in the same query as the book fetch.
+    - The ETag follows the book's version column, which reviews bump as well;
+      `If-None-Match` with it answers 304.
+    """
+    entry = response_cache.get(("summary", id))
+    if entry is not None:
+        return cached_json_response(request, entry)
 
-    if not reviews:
-        return {"summary": book.summary, "average_rating": None}
+    generation = response_cache.generation(id)
+    if RATING_ROLLUP:
+        query = select(Book.summary, Book.rating_sum, Book.rating_count, Book.version).where(Book.id == id)
+        book = (await db.execute(query)).one_or_none()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        summary, review_count, version = book.summary, book.rating_count, book.version
+        avg_rating = book.rating_sum / review_count if review_count else None
+    else:
+        query = (
+            select(Book.summary, func.avg(Review.rating), func.count(Review.id), Book.version)
+            .outerjoin(Review, Review.book_id == Book.id)
+            .where(Book.id == id)
+            .group_by(Book.id)
+        )
+        book = (await db.execute(query)).one_or_none()
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        summary, avg_rating, review_count, version = book
 
-    avg_rating = sum([review.rating for review in reviews]) / len(reviews)
-    return {"summary": book.summary, "average_rating": avg_rating}
+    body = json.dumps({"summary": summary, "average_rating": avg_rating, "review_count": review_count}).encode()
+    entry = CachedResponse(make_etag("summary", id, version), body, {})
+    return cached_json_response(request, response_cache.store(("summary", id), entry, book_id=id, generation=generation))
 
 
 
-# Generate a summary for a given book content (Authenticated)
-@router.post("/generate-summary", tags=["Books"], dependencies=[Depends(JWTBearer())])
+# Start generating a summary for an uploaded book (Authenticated)
+@router.post("/generate-summary", status_code=202, tags=["Books"], dependencies=[Depends(JWTBearer())])
 async def generate_summary(
     file: UploadFile = File(...), 
     user_id: int = Depends(JWTBearer())
 ):
-    # Placeholder for AI model interaction to generate summary
-    """Endpoint to upload a PDF file and get a short summary of the book."""
+    """
+    Endpoint to upload a PDF file and start generating a short summary of the book.
+    - The upload is copied to a temporary file and a job id is returned immediately.
+    - Documents summarized before (same bytes and model) come back with status "done".
+    - Text extraction/OCR and summarization run in the background; poll
+      GET /generate-summary/{job_id} for the result.
+    """
     if file.filename.endswith(".pdf"):
-        # Save the PDF file locally
-        pdf_file_path = f"temp_{file.filename}"
-        with open(pdf_file_path, "wb") as temp_file:
-            temp_file.write(file.file.read())
-        print('Step 1')
-        # Step 1: Try direct text extraction using PyPDF2
-        extracted_text = extract_text_from_pdf_using_pypdf2(pdf_file_path)
-        print('Step 2')
-        # Step 2: If direct text extraction fails, fall back to OCR
-        if not extracted_text:
-            extracted_text = extract_text_from_pdf_using_ocr(pdf_file_path)
-            print('Step 2 not')
-        # Step 3: Handle large text by splitting into smaller chunks if needed
-        final_summary = None
-        if len(extracted_text) > CHARACTER_LIMIT:
-            full_summary = handle_large_text(extracted_text)
-            final_summary = generate_short_summary(full_summary)
-        else:
-            final_summary = generate_short_summary(extracted_text)
-        print('Step 3')
-        # Step 4: Send the full_summary to Llama 3 again for further summarization
-        
-        print('Step 4')
-        print(final_summary)
-        # Clean up the temporary file
-        os.remove(pdf_file_path)
-
-        return {"final_summary": final_summary}
+        pdf_file_path, file_digest = await save_upload(file)
+        job = await submit_summary_job(pdf_file_path, file_digest, user_id)
+        return {"job_id": job["job_id"], "status": job["status"], "final_summary": job["final_summary"]}
     else:
-        return {"error": "Please upload a PDF file"}
+        return JSONResponse(status_code=400, content={"error": "Please upload a PDF file"})
+
+# Stream the summary of an uploaded book as Server-Sent Events (Authenticated)
+@router.post("/generate-summary/stream", tags=["Books"], dependencies=[Depends(JWTBearer())])
+async def generate_summary_stream(
+    file: UploadFile = File(...),
+    user_id: int = Depends(JWTBearer())
+):
+    """
+    Endpoint to upload a PDF file and receive its summary as a text/event-stream.
+    - "status" events mark extraction and summarization, "chunk" events carry each chunk
+      summary as it completes and "delta" events the final summary as it is generated.
+    - The stream ends with a "final" event holding the whole summary, or an "error" event.
+    - Disconnecting cancels the model calls still running.
+    """
+    if not file.filename.endswith(".pdf"):
+        return JSONResponse(status_code=400, content={"error": "Please upload a PDF file"})
+    pdf_file_path, file_digest = await save_upload(file)
+    return StreamingResponse(
+        stream_summary_events(pdf_file_path, file_digest),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Runs when the response ends, even if the client left before the stream was iterated
+        background=BackgroundTask(os.remove, pdf_file_path),
+    )
+
+# Poll a summary job (Authenticated)
+@router.get("/generate-summary/{job_id}", tags=["Books"], dependencies=[Depends(JWTBearer())])
+async def get_summary_job(
+    job_id: str,
+    user_id: int = Depends(JWTBearer())
+):
+    """Returns the job status and, once it is done, the final summary."""
+    job = jobs.get(job_id)
+    if not job or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "final_summary": job["final_summary"],
+        "error": job["error"],
+    }
 
 # Get book recommendations (Authenticated)
 @router.get("/recommendations",response_model=List[Recommendation], tags=["Books"], dependencies=[Depends(JWTBearer())])
@@ -146,7 +413,17 @@ async def get_recommendations(
     user_id: int = Depends(JWTBearer())
 ):
     """
-    Fetches the user's reviews and all books, sends them to Llama for personalized book recommendations.
+    Returns the user's personalized book recommendations.
+    - Answers are cached per user until the user reviews another book or the catalog changes.
+    - With RECOMMENDATION_SWR enabled a stale answer is returned immediately and refreshed in the background.
+    """
+    return await cached_recommendations(db, user_id, build_recommendations)
+
+
+async def build_recommendations(db: AsyncSession, user_id: int) -> List[dict]:
+    """
+    Fetches the user's reviews, picks the books nearest to their taste from the
+    embedding index and sends only those candidates to Llama for personalized book recommendations.
     """
     try:
 
@@ -160,15 +437,25 @@ async def get_recommendations(
         # Prepare user reviews for Llama
         user_reviews_data = [
             {
+                "id": review.id,
                 "book_id": review.book_id,
-                "review_text": review.review_text
+                "review_text": review.review_text,
+                "rating": review.rating
             }
             for review in user_reviews
         ]
 
-        # Step 2: Fetch all books
-        result_books = await db.execute(select(Book))
-        books = result_books.scalars().all()
+        # Step 2: Fetch the books closest to the user's review profile
+        await book_index.ensure_loaded(db)
+        profile = await book_index.profile(user_reviews_data)
+        reviewed_ids = {review.book_id for review in user_reviews}
+        candidates = book_index.search(profile, RECOMMENDATION_CANDIDATES, exclude=reviewed_ids)
+        if not candidates:
+            # Every indexed book has been reviewed; let the model choose among those
+            candidates = book_index.search(profile, RECOMMENDATION_CANDIDATES)
+        result_books = await db.execute(select(Book.id, Book.summary).where(Book.id.in_([book_id for book_id, _ in candidates])))
+        rank = {book_id: position for position, (book_id, _) in enumerate(candidates)}
+        books = sorted(result_books.all(), key=lambda book: rank[book.id])
 
         if not books:
             raise HTTPException(status_code=404, detail="No books found")
@@ -183,7 +470,7 @@ async def get_recommendations(
         ]
 
         # Step 3: Send user reviews and book summaries to Llama for recommendations
-        recommendation = get_llama_recommendations(user_reviews_data, books_data)
+        recommendation = await get_llama_recommendations(user_reviews_data, books_data)
         book_id = 0
         recommended_books =[{
                     "book_id": None,
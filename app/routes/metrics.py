@@ -0,0 +1,76 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.db import engine, pool_stats
+from app.utils.auth import token_cache
+from app.utils.facets import facets_cache
+from app.utils.llm import get_llm_client
+from app.utils.recommendations import recommendation_cache
+from app.utils.response_cache import response_cache
+from app.utils.password import password_hasher
+from app.utils.summary_cache import summary_cache
+from app.utils.telemetry import escape, render_metrics
+
+router = APIRouter()
+
+
+# Hit/miss counters of the in-process caches (unauthenticated, like a health check)
+@router.get("/metrics/cache", tags=["Metrics"])
+async def get_cache_metrics():
+    """
+    Size, hit/miss/eviction counts and hit ratio of each cache in this worker process.
+    `responses.not_modified` counts requests answered 304 from an ETag match.
+    """
+    return cache_stats()
+
+
+def cache_stats() -> dict:
+    return {
+        "responses": response_cache.stats(),
+        "tokens": token_cache.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "facets": facets_cache.stats(),
+        "summaries": summary_cache.stats(),
+    }
+
+
+def gauge_lines(name: str, documentation: str, kind: str, samples: list) -> list:
+    """Prometheus text lines for one metric; `samples` holds (labels dict, value) pairs."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        rendered = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+    return lines
+
+
+# Prometheus scrape endpoint (unauthenticated, like /metrics/cache)
+@router.get("/metrics", response_class=PlainTextResponse, tags=["Metrics"])
+async def get_metrics():
+    """
+    Request latency histograms per route, the db/auth/llm/pdf time spent by requests,
+    cache counters, connection/password pool gauges and LLM client gauges, in the Prometheus text format.
+    """
+    caches = cache_stats()
+    pool = pool_stats(engine)
+    lines = []
+    for counter in ("hits", "misses", "evictions"):
+        lines += gauge_lines(
+            f"cache_{counter}_total", f"Cache {counter} in this worker process.", "counter",
+            [({"cache": name}, stats[counter]) for name, stats in caches.items()],
+        )
+    lines += gauge_lines("http_not_modified_total", "Requests answered 304 from an ETag match.", "counter", [({}, caches["responses"]["not_modified"])])
+    lines += gauge_lines(
+        "db_pool_connections", "Connections of the primary engine's pool.", "gauge",
+        [({"state": state}, pool[state]) for state in ("size", "checked_out", "overflow") if state in pool],
+    )
+    if "wait_seconds_total" in pool:
+        lines += gauge_lines("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection.", "counter", [({}, pool["wait_seconds_total"])])
+        lines += gauge_lines("db_pool_timeouts_total", "Connection checkouts that timed out.", "counter", [({}, pool["timeouts"])])
+    passwords = password_hasher.stats()
+    lines += gauge_lines("password_pool_in_flight", "Password hashing operations running or queued.", "gauge", [({}, passwords["in_flight"])])
+    lines += gauge_lines("password_pool_rejected_total", "Password operations rejected with 503.", "counter", [({}, passwords["rejected"])])
+    llm = get_llm_client().stats()
+    lines += gauge_lines("llm_in_flight", "LLM calls running against the model server.", "gauge", [({}, llm["in_flight"])])
+    lines += gauge_lines("llm_waiting", "LLM calls waiting for a free concurrency slot.", "gauge", [({}, llm["waiting"])])
+    lines += gauge_lines("llm_retries_total", "LLM calls retried after a transient error.", "counter", [({}, llm["retries"])])
+    lines += gauge_lines("llm_failures_total", "LLM calls that failed after their retries.", "counter", [({}, llm["failures"])])
+    return render_metrics() + "\n".join(lines) + "\n"
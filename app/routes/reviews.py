@@ -1,14 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, bindparam, insert, or_, update
 from sqlalchemy.future import select
 from app.models import Book, Review
-from app.schemas import BookCreate, BookUpdate, ReviewCreate, BookOut, ReviewOut
+from app.schemas import BookCreate, BookUpdate, ReviewCreate, BookOut, ReviewOut, ReviewBatchOut
 from app.utils.auth import JWTBearer
-from typing import List
-from app.db import get_db
+from typing import List, Literal, Optional
+from app.db import get_db, get_read_db
+from app.utils.catalog import bump_rating_revision
+from app.utils.response_cache import response_cache
+from app.utils.fast_json import FAST_JSON, RowsJSONResponse
 
 router = APIRouter()
 
+# Largest number of reviews accepted by one batch submission
+MAX_REVIEW_BATCH_SIZE = 1000
+
+# Page sizes for review listings
+DEFAULT_REVIEW_PAGE_SIZE = 50
+MAX_REVIEW_PAGE_SIZE = 500
+
+# Columns served by the review listing (the fields of ReviewOut)
+REVIEW_FIELDS = tuple(ReviewOut.model_fields)
+REVIEW_COLUMNS = tuple(getattr(Review, field) for field in REVIEW_FIELDS)
+
+
+def encode_review_cursor(sort: str, review) -> str:
+    """Opaque cursor for the position after `review` in the given sort order."""
+    key = [review.rating, review.id] if sort == "rating" else [review.id]
+    return base64.urlsafe_b64encode(json.dumps([sort, *key]).encode()).decode()
+
+
+def is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_review_cursor(sort: str, cursor: str) -> list:
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(decoded, list) or not decoded:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    cursor_sort, *key = decoded
+    if cursor_sort != sort or len(key) != (2 if sort == "rating" else 1):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    # [rating, id] for the rating order, [id] otherwise
+    *ratings, review_id = key
+    if not is_int(review_id) or not all(is_int(rating) or isinstance(rating, float) for rating in ratings):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
 
 # Add a review for a book (Authenticated)
 @router.post("/books/reviews", response_model=ReviewOut, tags=["Reviews"], dependencies=[Depends(JWTBearer())])
@@ -20,21 +64,121 @@ async def add_review(
     book = await db.get(Book, review.book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    print(user_id)
     # Use user_id["user_id"] to link the review to the current user
     new_review = Review(review_text=review.review_text, book_id=review.book_id, user_id=user_id,rating=review.rating)
     db.add(new_review)
+    # Keep the book's rating rollup in step with its reviews, in the same transaction
+    await db.execute(
+        update(Book)
+        .where(Book.id == review.book_id)
+        .values(rating_sum=Book.rating_sum + review.rating, rating_count=Book.rating_count + 1, version=Book.version + 1)
+    )
     await db.commit()
     await db.refresh(new_review)
+    response_cache.invalidate_book(review.book_id)
+    bump_rating_revision()
     return new_review
 
+# Add many reviews in one transaction (Authenticated)
+@router.post("/books/reviews/batch", response_model=ReviewBatchOut, tags=["Reviews"], dependencies=[Depends(JWTBearer())])
+async def add_reviews_batch(
+    reviews: List[ReviewCreate],
+    db: AsyncSession = Depends(get_db),
+    user_id: int = Depends(JWTBearer())
+):
+    """
+    Adds up to MAX_REVIEW_BATCH_SIZE reviews for the current user.
+    - All book ids are checked with a single IN query.
+    - Reviews of unknown books are skipped and reported in `errors` with their index in the
+      request; every other review is created in one transaction and returned in `created`.
+    - If the insert itself fails, nothing is created.
+    """
+    if len(reviews) > MAX_REVIEW_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_REVIEW_BATCH_SIZE} reviews can be submitted at once")
+
+    requested_ids = {review.book_id for review in reviews}
+    result = await db.execute(select(Book.id).where(Book.id.in_(requested_ids)))
+    existing_ids = set(result.scalars().all())
+
+    rows, errors = [], []
+    for index, review in enumerate(reviews):
+        if review.book_id not in existing_ids:
+            errors.append({"index": index, "book_id": review.book_id, "detail": "Book not found"})
+            continue
+        rows.append({"review_text": review.review_text, "book_id": review.book_id, "user_id": user_id, "rating": review.rating})
+    if not rows:
+        return {"created": [], "errors": errors}
+
+    result = await db.execute(
+        insert(Review).values(rows).returning(Review.id, Review.book_id, Review.review_text, Review.rating)
+    )
+    created = result.all()
+
+    # Update the rating rollup of every affected book in one executemany
+    rollup = {}
+    for row in rows:
+        rating_sum, rating_count = rollup.get(row["book_id"], (0.0, 0))
+        rollup[row["book_id"]] = (rating_sum + row["rating"], rating_count + 1)
+    books = Book.__table__
+    await db.execute(
+        update(books)
+        .where(books.c.id == bindparam("b_id"))
+        .values(
+            rating_sum=books.c.rating_sum + bindparam("b_sum"),
+            rating_count=books.c.rating_count + bindparam("b_count"),
+            version=books.c.version + 1,
+        ),
+        [{"b_id": book_id, "b_sum": rating_sum, "b_count": rating_count} for book_id, (rating_sum, rating_count) in rollup.items()],
+    )
+    await db.commit()
+    for book_id in rollup:
+        response_cache.invalidate_book(book_id)
+    bump_rating_revision()
+    return {"created": created, "errors": errors}
+
 # Retrieve all reviews for a book (Authenticated)
 @router.get("/books/{id}/reviews", response_model=List[ReviewOut], tags=["Reviews"], dependencies=[Depends(JWTBearer())])
 async def get_reviews(
     id: int, 
-    db: AsyncSession = Depends(get_db), 
+    response: Response,
+    limit: int = Query(DEFAULT_REVIEW_PAGE_SIZE, ge=1, le=MAX_REVIEW_PAGE_SIZE),
+    sort: Literal["recent", "oldest", "rating"] = "recent",
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_read_db), 
     user_id: int = Depends(JWTBearer())
 ):
-    result = await db.execute(select(Review).filter(Review.book_id == id))
-    reviews = result.scalars().all()
+    """
+    Keyset-paginated reviews of a book.
+    - `sort=recent` (newest first), `oldest`, or `rating` (highest first, newest first among ties).
+    - Returns at most `limit` reviews and sets the `X-Next-Cursor` header when more are available;
+      pass it back as `cursor` with the same `sort` to get the next page.
+    """
+    query = select(*REVIEW_COLUMNS).filter(Review.book_id == id)
+    if sort == "oldest":
+        query = query.order_by(Review.id)
+    elif sort == "recent":
+        query = query.order_by(Review.id.desc())
+    else:
+        query = query.order_by(Review.rating.desc(), Review.id.desc())
+
+    if cursor is not None:
+        key = decode_review_cursor(sort, cursor)
+        if sort == "oldest":
+            query = query.filter(Review.id > key[0])
+        elif sort == "recent":
+            query = query.filter(Review.id < key[0])
+        else:
+            rating, review_id = key
+            query = query.filter(or_(Review.rating < rating, and_(Review.rating == rating, Review.id < review_id)))
+
+    # Fetch one extra row to find out whether there is a next page
+    result = await db.execute(query.limit(limit + 1))
+    reviews = result.all()
+    headers = {}
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        headers["X-Next-Cursor"] = encode_review_cursor(sort, reviews[-1])
+    if FAST_JSON:
+        return RowsJSONResponse(reviews, REVIEW_FIELDS, headers=headers)
+    response.headers.update(headers)
     return reviews
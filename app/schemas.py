@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Union
 
 class GetUser(BaseModel):
     email: EmailStr
@@ -67,7 +67,28 @@ class ReviewOut(BaseModel):
     class Config:
         from_attributes  = True
 
+# Per-item error of a batch review submission
+class ReviewBatchError(BaseModel):
+    index: int
+    book_id: int
+    detail: str
+
+# Result of a batch review submission
+class ReviewBatchOut(BaseModel):
+    created: List[ReviewOut]
+    errors: List[ReviewBatchError]
+
 class Recommendation(BaseModel):
     book_id: int
     summary: Optional[str] = None
-    recommendation: Optional[str] = None
\ No newline at end of file
+    recommendation: Optional[str] = None
+
+# Number of books sharing one value of a facet
+class FacetCount(BaseModel):
+    value: Optional[Union[int, str]] = None
+    count: int
+
+# Filter sidebar counts for the book listing
+class BookFacets(BaseModel):
+    genres: List[FacetCount]
+    decades: List[FacetCount]
@@ -1,11 +1,19 @@
 import jwt
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
 from datetime import datetime, timedelta
-from fastapi import Request, HTTPException, status, Depends
+from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete
 from sqlalchemy.future import select
-from app.db import get_db
+from app.db import AsyncSessionLocal, get_db
 from app.models import Token, User
+from app.utils.cache import TTLCache
+from app.utils.telemetry import timed
 from dotenv import load_dotenv
 import os
 import sys
@@ -14,76 +22,202 @@ from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 # Load environment variables
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
 load_dotenv()
+logger = logging.getLogger(__name__)
 secret_key = os.environ["secret_key"]
 algorithm = os.environ["algorithm"]
 
+# "stateful" checks every token against the tokens table; "stateless" trusts the signed JWT
+# and only consults the revocation denylist
+AUTH_MODE = os.environ.get("AUTH_MODE", "stateful").lower()
+# Revoked token ids are kept here in stateless mode; unset keeps them in process memory
+TOKEN_DENYLIST_URL = os.environ.get("TOKEN_DENYLIST_URL")
+# Background purge of expired rows from the tokens table (stateful mode); 0 disables it
+TOKEN_SWEEP_INTERVAL_SECONDS = int(os.environ.get("TOKEN_SWEEP_INTERVAL_SECONDS", 600))
+TOKEN_SWEEP_BATCH_SIZE = int(os.environ.get("TOKEN_SWEEP_BATCH_SIZE", 1000))
+
+# Verified tokens are cached until their "exp", but never longer than this,
+# so rows deleted from the tokens table outside of invalidate_token() still stop working
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL_SECONDS = int(os.environ.get("TOKEN_CACHE_TTL_SECONDS", 300))
+
+# Verified token hash -> user id
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+
+
+def token_cache_key(token: str) -> str:
+    """Cache key for a token; raw tokens are never kept in memory as keys."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalidate_token(token: str) -> None:
+    """Drop a token from the verification cache so that its revocation takes effect immediately."""
+    token_cache.pop(token_cache_key(token))
+
+
+class MemoryDenylist:
+    """Revoked token ids held in process memory until the tokens would have expired anyway."""
+
+    def __init__(self):
+        self._expiry = {}
+
+    async def add(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        self._expiry = {key: exp for key, exp in self._expiry.items() if exp > now}
+        if expires_at > now:
+            self._expiry[jti] = expires_at
+
+    async def contains(self, jti: str) -> bool:
+        expires_at = self._expiry.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+
+class RedisDenylist:
+    """Revoked token ids shared between workers through Redis (or any server speaking its protocol)."""
+
+    def __init__(self, url: str, prefix: str = "denylist:"):
+        import redis.asyncio as redis  # Optional dependency, only needed when TOKEN_DENYLIST_URL is set
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def add(self, jti: str, expires_at: float) -> None:
+        if expires_at > time.time():
+            await self.client.set(self.prefix + jti, 1, exat=int(expires_at) + 1)
+
+    async def contains(self, jti: str) -> bool:
+        return bool(await self.client.exists(self.prefix + jti))
+
+
+token_denylist = RedisDenylist(TOKEN_DENYLIST_URL) if TOKEN_DENYLIST_URL else MemoryDenylist()
+
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_error)
 
     async def __call__(self, request: Request, db: AsyncSession = Depends(get_db)):
+        # Routes declare JWTBearer both as a dependency and as a parameter; verify once per request
+        user_id = getattr(request.state, "user_id", None)
+        if user_id is not None:
+            return user_id
         credentials: HTTPAuthorizationCredentials = await super(JWTBearer, self).__call__(request)
         if credentials:
             if credentials.scheme != "Bearer":
                 raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
             token = credentials.credentials
-            if not await self.verify_jwt(token, db):
+            user_id = await self.verify_jwt(token, db)
+            if not user_id:
                 raise HTTPException(status_code=403, detail="Invalid or expired token.")
-            return await self.extract_user_from_jwt(token)
+            request.state.user_id = user_id
+            return user_id
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
-    # Asynchronous JWT verification
-    async def verify_jwt(self, token: str, db: AsyncSession) -> bool:
+    # Asynchronous JWT verification, returns the user id of a valid token
+    async def verify_jwt(self, token: str, db: AsyncSession) -> int:
+        if AUTH_MODE == "stateless":
+            return await self.verify_stateless_jwt(token)
+        cache_key = token_cache_key(token)
+        user_id = token_cache.get(cache_key)
+        if user_id is not None:
+            return user_id
         try:
-            # Decode the token with the secret key and check if it's expired
-            decoded_token = jwt.decode(token, secret_key, algorithms=[algorithm])
-
-            # Optional: Print decoded token for debugging purposes
-            print(f"Decoded Token: {decoded_token}")
+            # Decode the token with the secret key and check if it's expired (the token lookup
+            # below is database time, so only the decode counts as auth)
+            with timed("auth"):
+                decoded_token = jwt.decode(token, secret_key, algorithms=[algorithm])
 
             # Asynchronously retrieve token from the database and verify its existence
-            result = await db.execute(select(Token).filter(Token.token == token))
+            result = await db.execute(select(Token.id).filter(Token.token == token))
             db_token = result.scalar_one_or_none()
 
             if db_token is None:
-                print(f"Token passed in header: {token}")  # Debugging: Print passed token
-                print("Token not found in database.")  # Debugging: Token not found
+                logger.debug("Token not found in database")
                 raise HTTPException(status_code=403, detail="Token not found in database.")
 
-            return True  # If token is valid and found in the database
+            user_id = int(decoded_token.get("sub"))  # Assuming "sub" contains user identification info
+            expires_at = time.time() + TOKEN_CACHE_TTL_SECONDS
+            if decoded_token.get("exp") is not None:
+                expires_at = min(expires_at, decoded_token["exp"])
+            token_cache.set(cache_key, user_id, expires_at=expires_at)
+            return user_id  # If token is valid and found in the database
         except ExpiredSignatureError:
             # Handle expired token
             raise HTTPException(status_code=401, detail="Token has expired")
         except InvalidTokenError:
             # Handle invalid token signature
             raise HTTPException(status_code=401, detail="Invalid token")
-        except Exception as e:
+        except Exception:
             # Catch any other exception for debugging purposes
-            print(f"Exception in token verification: {e}")
+            logger.debug("Exception in token verification", exc_info=True)
             raise HTTPException(status_code=401, detail="Invalid token")
 
-    async def extract_user_from_jwt(self, token: str):
+    # Stateless verification: signature and expiry, plus the denylist of revoked token ids
+    async def verify_stateless_jwt(self, token: str) -> int:
         try:
-            payload = jwt.decode(token, secret_key, algorithms=[algorithm])
-            return int(payload.get("sub"))  # Assuming "sub" contains user identification info
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
+            with timed("auth"):
+                decoded_token = jwt.decode(token, secret_key, algorithms=[algorithm])
+        except ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token has expired")
         except InvalidTokenError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+            raise HTTPException(status_code=401, detail="Invalid token")
+        jti = decoded_token.get("jti")
+        if jti is None or await token_denylist.contains(jti):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        return int(decoded_token.get("sub"))
 
 
 # Create access token with async database interaction
 async def create_access_token(subject: str, db: AsyncSession, expires_delta: int = None) -> str:
     expires = datetime.utcnow() + timedelta(minutes=expires_delta) if expires_delta else datetime.utcnow() + timedelta(minutes=30)
-    to_encode = {"exp": expires, "sub": str(subject)}
+    to_encode = {"exp": expires, "sub": str(subject), "jti": uuid.uuid4().hex}
     token = jwt.encode(to_encode, secret_key, algorithm=algorithm)
-    
+
+    # Stateless tokens are self-contained; nothing to store
+    if AUTH_MODE == "stateless":
+        return token
+
     # Asynchronously save the token to the database
-    db_token = Token(token=token, user_id=subject)
+    db_token = Token(token=token, user_id=subject, expires_at=expires)
     db.add(db_token)
     await db.commit()  # Use await for async commit
+    return token
 
-    print(f"Token saved in the database: {token}")  # Debugging: Print token
 
-    return token
+# Revoke an access token: delete its database row and evict it from the verification cache
+async def revoke_token(token: str, db: AsyncSession) -> None:
+    if AUTH_MODE == "stateless":
+        decoded_token = jwt.decode(token, secret_key, algorithms=[algorithm])
+        await token_denylist.add(decoded_token["jti"], decoded_token["exp"])
+        return
+    result = await db.execute(select(Token).filter(Token.token == token))
+    for db_token in result.scalars().all():
+        await db.delete(db_token)
+    await db.commit()
+    invalidate_token(token)
+
+
+# Delete expired rows from the tokens table in batches; returns the number of rows removed
+async def purge_expired_tokens(db: AsyncSession, batch_size: int = TOKEN_SWEEP_BATCH_SIZE) -> int:
+    purged = 0
+    while True:
+        expired = select(Token.id).filter(Token.expires_at < datetime.utcnow()).limit(batch_size)
+        result = await db.execute(delete(Token).where(Token.id.in_(expired)))
+        await db.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            return purged
+
+
+# Background task started by the app lifespan: purge expired tokens every TOKEN_SWEEP_INTERVAL_SECONDS
+async def run_token_sweeper(interval: int = TOKEN_SWEEP_INTERVAL_SECONDS) -> None:
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await purge_expired_tokens(db)
+        except Exception:
+            logger.exception("Token sweep failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,255 @@
+"""
+Bulk loading of books from NDJSON or CSV.
+
+Records are validated against BookCreate in batches and each valid batch is
+inserted in its own transaction, either with an executemany INSERT ... RETURNING
+(sent as multi-row statements of insertmanyvalues pages, within the driver's bind
+parameter limit) or, on PostgreSQL/asyncpg with `use_copy`, with COPY via
+copy_records_to_table.
+
+Command line usage:
+
+    python -m app.utils.bulk_import books.ndjson --batch-size 1000 [--format csv] [--copy]
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import os
+import sys
+from collections import deque
+from typing import AsyncIterator, Iterable, List, Optional
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from app.models import Book
+from app.utils.catalog import bump_stored_catalog_revision
+from app.schemas import BookCreate
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+BULK_IMPORT_BATCH_SIZE = int(os.environ.get("BULK_IMPORT_BATCH_SIZE", 1000))
+MAX_BULK_IMPORT_BATCH_SIZE = 10000
+BOOK_COLUMNS = ["title", "author", "genre", "year_published", "summary"]
+FILE_CHUNK_SIZE = 1024 * 1024
+INVALID_UTF8 = "invalid UTF-8"
+
+
+def decode_line(line: bytes) -> Optional[str]:
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[str]]:
+    """
+    Split a stream of byte chunks into decoded lines without buffering the whole body.
+    A line that is not valid UTF-8 is yielded as None so it is reported like other invalid input.
+    """
+    pending = b""
+    first = True
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if first:
+                line, first = line.removeprefix(codecs.BOM_UTF8), False
+            yield decode_line(line)
+    if first:
+        pending = pending.removeprefix(codecs.BOM_UTF8)
+    if pending:
+        yield decode_line(pending)
+
+
+class LineFeed:
+    """Iterator of queued lines for csv.reader, which is only advanced once a whole record is queued."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def iter_csv_records(lines: AsyncIterator[Optional[str]]) -> AsyncIterator[tuple]:
+    """
+    Yield (first line number, record dict or parse error message) for CSV input with a header row.
+    One csv.reader parses the whole stream, so quoted fields may span lines.
+    """
+    feed = LineFeed()
+    reader = csv.reader(feed)
+    header = None
+
+    def parse(final: bool = False):
+        """(line number, values or error) for each record that is complete among the queued lines."""
+        parsed = []
+        # An odd number of quotes means a quoted field continues on a line not read yet
+        while feed.lines and (final or not sum(line.count('"') for line in feed.lines) % 2):
+            line_number = reader.line_num + 1
+            try:
+                parsed.append((line_number, next(reader)))
+            except csv.Error as e:
+                feed.lines.clear()
+                parsed.append((line_number, f"invalid CSV: {e}"))
+        return parsed
+
+    async def records():
+        async for line in lines:
+            if line is None:
+                yield reader.line_num + len(feed.lines) + 1, INVALID_UTF8
+                line = ""  # stands in for the undecodable line so later line numbers stay right
+            feed.lines.append(line + "\n")
+            for item in parse():
+                yield item
+        for item in parse(final=True):
+            yield item
+
+    async for line_number, values in records():
+        if isinstance(values, str):
+            yield line_number, values
+            continue
+        if not values or (len(values) == 1 and not values[0].strip()):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_number, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield line_number, {name: value for name, value in zip(header, values) if value != ""}
+
+
+async def iter_records(lines: AsyncIterator[Optional[str]], fmt: str) -> AsyncIterator[tuple]:
+    """Yield (line number, record dict or parse error message) for NDJSON or CSV input."""
+    if fmt == "csv":
+        async for item in iter_csv_records(lines):
+            yield item
+        return
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if line is None:
+            yield line_number, INVALID_UTF8
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, f"invalid JSON: {e.msg}"
+            continue
+        yield line_number, record if isinstance(record, dict) else "expected a JSON object"
+
+
+def validate_batch(batch: Iterable[tuple]) -> tuple:
+    """Split (line number, record) pairs into insertable rows and per-line errors."""
+    rows, errors = [], []
+    for line_number, record in batch:
+        if isinstance(record, str):
+            errors.append({"line": line_number, "error": record})
+            continue
+        try:
+            rows.append(BookCreate(**record).dict())
+        except ValidationError as e:
+            errors.append({"line": line_number, "error": "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )})
+    return rows, errors
+
+
+async def insert_batch(db: AsyncSession, rows: List[dict], use_copy: bool = False) -> int:
+    """Insert one batch of validated rows and commit it."""
+    if use_copy and db.bind.dialect.driver == "asyncpg":
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            Book.__tablename__,
+            records=[tuple(row[column] for column in BOOK_COLUMNS) for row in rows],
+            columns=BOOK_COLUMNS,
+        )
+        inserted = len(rows)
+    else:
+        # executemany form: pages of rows stay under the bind parameter limit whatever the batch size
+        result = await db.execute(insert(Book).returning(Book.id), rows)
+        inserted = len(result.all())
+    await bump_stored_catalog_revision(db)
+    await db.commit()
+    return inserted
+
+
+async def import_books(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    fmt: str = "ndjson",
+    batch_size: int = BULK_IMPORT_BATCH_SIZE,
+    use_copy: bool = False,
+) -> dict:
+    """
+    Stream records from `chunks` into the books table in batches of `batch_size`.
+    A batch with invalid records still inserts its valid ones; a batch whose insert
+    fails is rolled back as a whole and reported, and the import continues.
+    """
+    report = {"inserted": 0, "failed": 0, "batches": []}
+
+    async def flush(batch: List[tuple]) -> None:
+        rows, errors = validate_batch(batch)
+        entry = {"batch": len(report["batches"]) + 1, "first_line": batch[0][0], "inserted": 0, "errors": errors}
+        if rows:
+            try:
+                entry["inserted"] = await insert_batch(db, rows, use_copy)
+            except Exception as e:
+                await db.rollback()
+                entry["errors"].append({"line": None, "error": f"batch insert failed: {e}"})
+                report["failed"] += len(rows)
+        report["inserted"] += entry["inserted"]
+        report["failed"] += len(errors)
+        report["batches"].append(entry)
+
+    batch = []
+    async for item in iter_records(iter_lines(chunks), fmt):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    return report
+
+
+async def iter_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as source:
+        while chunk := await asyncio.to_thread(source.read, FILE_CHUNK_SIZE):
+            yield chunk
+
+
+async def main(args: argparse.Namespace) -> None:
+    from app.db import AsyncSessionLocal, engine, Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    async with AsyncSessionLocal() as db:
+        report = await import_books(db, iter_file(args.path), fmt, args.batch_size, args.copy)
+    for entry in report["batches"]:
+        for error in entry["errors"]:
+            print(f"batch {entry['batch']} line {error['line']}: {error['error']}", file=sys.stderr)
+    print(f"inserted {report['inserted']} books, {report['failed']} failed, {len(report['batches'])} batches")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import books from NDJSON or CSV")
+    parser.add_argument("path", help="NDJSON or CSV file of BookCreate records")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=BULK_IMPORT_BATCH_SIZE)
+    parser.add_argument("--copy", action="store_true", help="use COPY (PostgreSQL/asyncpg only)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,47 @@
+import itertools
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import CatalogRevision
+
+# Process-local catalog revision, bumped on every book create/update/delete.
+# Caches derived from the whole catalog compare it to detect staleness.
+_revisions = itertools.count(1)
+_current = 0
+
+# Process-local rating revision, bumped whenever reviews change book ratings.
+_rating_revisions = itertools.count(1)
+_rating_current = 0
+
+
+def catalog_revision() -> int:
+    return _current
+
+
+def bump_catalog_revision() -> int:
+    global _current
+    _current = next(_revisions)
+    return _current
+
+
+def rating_revision() -> int:
+    return _rating_current
+
+
+def bump_rating_revision() -> int:
+    global _rating_current
+    _rating_current = next(_rating_revisions)
+    return _rating_current
+
+
+# The process-local revisions above only see this worker's writes; they key local caches.
+# State shared with other workers reads the catalog revision persisted in the
+# catalog_revision row, which every book write bumps in its own transaction.
+
+async def stored_catalog_revision(db: AsyncSession) -> int:
+    """Catalog revision as committed in the database."""
+    return (await db.execute(select(CatalogRevision.catalog).where(CatalogRevision.id == 1))).scalar_one_or_none() or 0
+
+
+async def bump_stored_catalog_revision(db: AsyncSession) -> None:
+    """Bump the persisted catalog revision within the session's transaction; it commits with the write."""
+    await db.execute(update(CatalogRevision).where(CatalogRevision.id == 1).values(catalog=CatalogRevision.catalog + 1))
@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import tempfile
+import re
+import sys
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from dotenv import load_dotenv
+from app.db import AsyncSessionLocal
+from app.models import Book
+from app.utils.catalog import stored_catalog_revision
+from app.utils.llm import get_llm_client
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "ollama" embeds with EMBEDDING_MODEL on the Ollama server, "hashing" is a local deterministic embedder
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "ollama")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "nomic-embed-text")
+EMBEDDING_BATCH_SIZE = 256
+# Where the book index is persisted between restarts; empty disables persistence
+EMBEDDING_INDEX_PATH = os.environ.get("EMBEDDING_INDEX_PATH", os.path.join(tempfile.gettempdir(), "jktech-book-index.npz"))
+# Books whose documents are fetched per query when syncing the index
+SYNC_FETCH_SIZE = 1000
+# Number of nearest books passed to the LLM for recommendations
+RECOMMENDATION_CANDIDATES = int(os.environ.get("RECOMMENDATION_CANDIDATES", 10))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder (feature hashing); needs no model server, used in tests."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"[a-z0-9']+", (text or "").lower()):
+                digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                matrix[row, digest % self.dimensions] += 1.0 if digest & (1 << 63) else -1.0
+        return normalize_rows(matrix)
+
+
+class OllamaEmbedder:
+    """Embeddings from the Ollama server's embedding model, through the shared LLM client."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = await get_llm_client().embed(self.model, [text or "" for text in texts])
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+def book_document(book) -> str:
+    """Text embedded for a book."""
+    return f"{book.title} by {book.author}. {book.genre}. {book.summary or ''}"
+
+
+def document_digest(document: str) -> str:
+    return hashlib.blake2b(document.encode(), digest_size=16).hexdigest()
+
+
+def embedder_key(embedder) -> str:
+    """Identifies the vectors an embedder produces; a saved index is only reused by the same one."""
+    return f"{type(embedder).__name__}:{getattr(embedder, 'model', '')}:{getattr(embedder, 'dimensions', '')}"
+
+
+def write_index(path: str, arrays: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        np.savez(fh, **arrays)
+    os.replace(tmp, path)  # atomic, so workers sharing the file never read a partial index
+
+
+def read_index(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as saved:
+        return {name: saved[name] for name in saved.files}
+
+
+class VectorIndex:
+    """
+    In-memory index of book embeddings: one L2-normalized row per book in a NumPy matrix,
+    searched by cosine similarity. Built at startup (warm_up), persisted to EMBEDDING_INDEX_PATH
+    and kept current with upsert/remove as this worker creates, updates and deletes books.
+    - Records the stored catalog revision it was synced to; ensure_loaded() syncs again when
+      the database has moved on (writes by other workers, CLI imports). A sync compares book
+      versions and re-embeds only the books whose document changed.
+    - Every local upsert/remove takes a ticket; an embedding finishing after a newer change to
+      the same book (including one applied by a sync) is dropped instead of installed.
+    """
+
+    def __init__(self, embedder, path: str = ""):
+        self.embedder = embedder
+        self.path = path
+        self.ids: List[int] = []
+        self.positions = {}
+        self.matrix: Optional[np.ndarray] = None
+        # book id -> Book.version / document digest the book's vector was built from
+        self.versions = {}
+        self.digests = {}
+        self.loaded = False
+        # Stored catalog revision the index was last synced to; None: sync on next use
+        self.revision: Optional[int] = None
+        # book id -> ticket of its latest local upsert/remove
+        self.touched = {}
+        self._tickets = itertools.count(1)
+        self._sync_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    async def _embed_all(self, documents: List[str]) -> Optional[np.ndarray]:
+        blocks = []
+        for start in range(0, len(documents), EMBEDDING_BATCH_SIZE):
+            blocks.append(await self.embedder.embed(documents[start:start + EMBEDDING_BATCH_SIZE]))
+        return np.vstack(blocks) if blocks else None
+
+    def _install(self, ids: List[int], matrix: Optional[np.ndarray]) -> None:
+        self.ids = list(ids)
+        self.positions = {book_id: row for row, book_id in enumerate(self.ids)}
+        self.matrix = matrix
+
+    async def rebuild(self, items: Iterable[Tuple[int, str]]) -> None:
+        """Replace the index contents with (book_id, document) pairs."""
+        items = list(items)
+        self._install([book_id for book_id, _ in items], await self._embed_all([document for _, document in items]))
+        self.versions = {}
+        self.digests = {book_id: document_digest(document) for book_id, document in items}
+        self.loaded = True
+
+    def invalidate(self) -> None:
+        """Sync with the database on next use (the stored revision is also bumped by the write)."""
+        self.revision = None
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Bring the index up to date with the catalog revision committed in the database."""
+        revision = await stored_catalog_revision(db)
+        if revision == self.revision:
+            return
+        async with self._sync_lock:
+            if revision != self.revision:
+                await self.sync(db, revision)
+
+    async def sync(self, db: AsyncSession, revision: int) -> None:
+        """
+        Apply the catalog as of `revision` (read before this snapshot): embed new and changed
+        books, drop deleted ones. Books touched locally after the snapshot keep their local state.
+        """
+        snapshot = next(self._tickets)
+        current = dict((await db.execute(select(Book.id, Book.version))).all())
+        stale = [book_id for book_id, version in current.items() if self.versions.get(book_id) != version]
+        changed = []
+        for start in range(0, len(stale), SYNC_FETCH_SIZE):
+            chunk = stale[start:start + SYNC_FETCH_SIZE]
+            result = await db.execute(
+                select(Book.id, Book.version, Book.title, Book.author, Book.genre, Book.summary).where(Book.id.in_(chunk))
+            )
+            for book in result.all():
+                document = book_document(book)
+                digest = document_digest(document)
+                if book.id in self.positions and self.digests.get(book.id) == digest:
+                    self.versions[book.id] = book.version  # only ratings changed
+                else:
+                    changed.append((book.id, book.version, document, digest))
+        matrix = await self._embed_all([document for _, _, document, _ in changed])
+        for row, (book_id, version, _, digest) in enumerate(changed):
+            if self.touched.get(book_id, 0) < snapshot:
+                self._set(book_id, matrix[row])
+                self.versions[book_id], self.digests[book_id] = version, digest
+        deleted = [book_id for book_id in self.positions if book_id not in current and self.touched.get(book_id, 0) < snapshot]
+        for book_id in deleted:
+            self._remove(book_id)
+        self.revision, self.loaded = revision, True
+        if stale or deleted:
+            await self.save()
+
+    async def upsert(self, book_id: int, document: str) -> None:
+        if not self.loaded:
+            return  # the write bumped the stored revision, so the first sync picks the book up
+        ticket = next(self._tickets)
+        self.touched[book_id] = ticket
+        digest = document_digest(document)
+        if book_id in self.positions and self.digests.get(book_id) == digest:
+            return
+        vector = (await self.embedder.embed([document]))[0]
+        if self.touched.get(book_id) != ticket:
+            return  # removed or upserted again while this embedding ran
+        self._set(book_id, vector)
+        self.digests[book_id] = digest
+        self.versions.pop(book_id, None)  # the next sync checks the book against the database
+
+    def _set(self, book_id: int, vector: np.ndarray) -> None:
+        row = self.positions.get(book_id)
+        if row is not None:
+            self.matrix[row] = vector
+        elif self.matrix is None:
+            self.ids, self.positions, self.matrix = [book_id], {book_id: 0}, vector[np.newaxis, :]
+        else:
+            self.positions[book_id] = len(self.ids)
+            self.ids.append(book_id)
+            self.matrix = np.vstack([self.matrix, vector])
+
+    def remove(self, book_id: int) -> None:
+        self.touched[book_id] = next(self._tickets)
+        self._remove(book_id)
+
+    def _remove(self, book_id: int) -> None:
+        self.versions.pop(book_id, None)
+        self.digests.pop(book_id, None)
+        row = self.positions.pop(book_id, None)
+        if row is None:
+            return
+        # Move the last row into the freed slot to keep the matrix dense
+        last = len(self.ids) - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = self.ids[last]
+            self.positions[self.ids[row]] = row
+        self.ids.pop()
+        self.matrix = self.matrix[:last] if last else None
+
+    async def save(self) -> None:
+        """Persist the index to self.path (no-op without a path); the file is written off the event loop."""
+        if not self.path:
+            return
+        arrays = {
+            "embedder": np.array(embedder_key(self.embedder)),
+            "revision": np.array(self.revision if self.revision is not None else -1),
+            "ids": np.array(self.ids, dtype=np.int64),
+            "versions": np.array([self.versions.get(book_id, -1) for book_id in self.ids], dtype=np.int64),
+            "digests": np.array([self.digests.get(book_id, "") for book_id in self.ids], dtype="U32"),
+            # upsert() writes rows in place, so the writer thread gets its own copy
+            "matrix": self.matrix.copy() if self.matrix is not None else np.zeros((0, 0), dtype=np.float32),
+        }
+        await asyncio.to_thread(write_index, self.path, arrays)
+
+    async def load(self) -> bool:
+        """Install the index saved at self.path if it was built with the same embedder."""
+        saved = await asyncio.to_thread(read_index, self.path) if self.path else None
+        if saved is None or str(saved["embedder"]) != embedder_key(self.embedder):
+            return False
+        ids = [int(book_id) for book_id in saved["ids"]]
+        self._install(ids, saved["matrix"] if ids else None)
+        self.versions = {book_id: int(version) for book_id, version in zip(ids, saved["versions"]) if version >= 0}
+        self.digests = {book_id: str(digest) for book_id, digest in zip(ids, saved["digests"])}
+        self.revision = int(saved["revision"]) if saved["revision"] >= 0 else None
+        self.loaded = True
+        return True
+
+    async def warm_up(self) -> None:
+        """Load the persisted index and sync it with the database; started by the app lifespan."""
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Loading the book embedding index from %s failed", self.path)
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.ensure_loaded(db)
+            logger.info("Book embedding index ready: %d books at catalog revision %s", len(self), self.revision)
+        except Exception:
+            logger.exception("Building the book embedding index failed; it is built on first use")
+
+    def vectors_for(self, book_ids: Iterable[int]) -> dict:
+        return {book_id: self.matrix[self.positions[book_id]] for book_id in book_ids if book_id in self.positions}
+
+    def search(self, query: np.ndarray, k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Top-k (book_id, cosine similarity) pairs, best first."""
+        if self.matrix is None or k <= 0:
+            return []
+        scores = self.matrix @ (query / (np.linalg.norm(query) or 1.0))
+        for book_id in exclude:
+            if book_id in self.positions:
+                scores[self.positions[book_id]] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row], float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+    async def profile(self, reviews: Sequence[dict]) -> Optional[np.ndarray]:
+        """
+        Taste vector of a user: the embedded review texts plus the vectors of the reviewed
+        books, weighted by how far each rating is from the middle of the 0-5 scale.
+        """
+        if not reviews:
+            return None
+        vector = (await self.embedder.embed([review["review_text"] for review in reviews])).sum(axis=0)
+        book_vectors = self.vectors_for(review["book_id"] for review in reviews)
+        for review in reviews:
+            if review["book_id"] in book_vectors and review.get("rating") is not None:
+                vector = vector + (review["rating"] - 2.5) * book_vectors[review["book_id"]]
+        return vector
+
+
+def create_embedder():
+    if EMBEDDING_BACKEND == "hashing":
+        return HashingEmbedder()
+    return OllamaEmbedder()
+
+
+book_index = VectorIndex(create_embedder(), EMBEDDING_INDEX_PATH)
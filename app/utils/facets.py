@@ -0,0 +1,50 @@
+import os
+import sys
+from collections import Counter
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from dotenv import load_dotenv
+from app.models import Book
+from app.utils.cache import TTLCache
+from app.utils.catalog import catalog_revision
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Facets are recomputed after any book write in this process; the TTL bounds how long
+# writes made through other worker processes can go unnoticed
+FACETS_CACHE_TTL_SECONDS = int(os.environ.get("FACETS_CACHE_TTL_SECONDS", 60))
+
+# catalog revision -> facets
+facets_cache = TTLCache(maxsize=4, ttl=FACETS_CACHE_TTL_SECONDS)
+
+
+def facet_counts(counter: Counter) -> list:
+    """[{value, count}] by descending count, then value (unknown values last)."""
+    return [
+        {"value": value, "count": count}
+        for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0] is None, str(item[0])))
+    ]
+
+
+async def book_facets(db: AsyncSession) -> dict:
+    """
+    Book counts per genre and per decade of publication. One GROUP BY (genre, decade)
+    query yields both; it is rolled up here and cached per catalog revision.
+    """
+    revision = catalog_revision()
+    cached = facets_cache.get(revision)
+    if cached is not None:
+        return cached
+
+    decade = (Book.year_published // 10 * 10).label("decade")
+    result = await db.execute(select(Book.genre, decade, func.count(Book.id)).group_by(Book.genre, decade))
+    genres, decades = Counter(), Counter()
+    for genre, book_decade, count in result.all():
+        genres[genre] += count
+        decades[book_decade] += count
+
+    facets = {"genres": facet_counts(genres), "decades": facet_counts(decades)}
+    facets_cache.set(revision, facets)
+    return facets
@@ -0,0 +1,48 @@
+import json
+import os
+import sys
+from typing import Any, Sequence
+from fastapi import Response
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Encode large list responses straight from selected columns instead of validating
+# every row through its Pydantic response model
+FAST_JSON = os.environ.get("FAST_JSON", "false").lower() == "true"
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def rows_to_json(rows: Sequence, fields: Sequence[str]) -> bytes:
+    """
+    JSON array of objects with exactly `fields`, read from SQLAlchemy rows of selected columns.
+    Fields that were not selected are rendered as null, like an unset Optional model field.
+    """
+    if not rows:
+        return b"[]"
+    columns = rows[0]._fields
+    positions = [(field, columns.index(field) if field in columns else None) for field in fields]
+    return dumps([
+        {field: (row[position] if position is not None else None) for field, position in positions}
+        for row in rows
+    ])
+
+
+class RowsJSONResponse(Response):
+    """JSON response rendered from rows by rows_to_json(); the route's response_model still documents it."""
+
+    media_type = "application/json"
+
+    def __init__(self, rows: Sequence, fields: Sequence[str], **kwargs):
+        super().__init__(content=rows_to_json(rows, fields), **kwargs)
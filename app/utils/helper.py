@@ -1,16 +1,30 @@
+import asyncio
+import logging
+import re
+from contextlib import aclosing
 import pytesseract
 from pdf2image import convert_from_path
-import ollama
 from pypdf import PdfReader
 import json
 from typing import List
+from app.utils.summary_cache import cache_key
+from app.utils.llm import get_llm_client
+from app.utils.prompts import build_recommendation_prompt
 from dotenv import load_dotenv
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
 load_dotenv() 
+logger = logging.getLogger(__name__)
 
 CHARACTER_LIMIT = 4000  # This is an example limit; adjust based on your model’s capabilities
+# Word limits for redone reduce rounds: about six characters per word, at least 20 words per chunk
+BRIEF_SUMMARY_CHARS_PER_WORD = 6
+MIN_BRIEF_SUMMARY_WORDS = 20
+# Maximum number of chunk summaries requested from Ollama at the same time
+SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_CONCURRENCY", 4))
+# Pages whose text layer has fewer characters than this are treated as scanned and OCR'd
+MIN_PAGE_TEXT_CHARS = int(os.environ.get("MIN_PAGE_TEXT_CHARS", 20))
 model = os.environ["model"]
 tesseract_cmd = os.environ["tesseract_cmd"]
 # Path to Tesseract executable if it's not in your PATH environment
@@ -19,74 +33,233 @@ pytesseract.pytesseract.tesseract_cmd = tesseract_cmd #r'C:\Program Files\Tesser
 # Define a character limit for the text to be processed at once (adjust as per the model’s input limit)
 
 
-def extract_text_from_pdf_using_pypdf2(pdf_file_path):
-    """Attempt to extract text directly from the PDF using PyPDF2."""
+def ocr_pdf_page(pdf_file_path, page_number):
+    """Rasterize a single page (1-based) and extract its text using Tesseract OCR."""
+    images = convert_from_path(pdf_file_path, first_page=page_number, last_page=page_number)
+    return "".join(pytesseract.image_to_string(image) for image in images)
+
+def count_pdf_pages(pdf_file_path):
+    """Return the number of pages in the PDF."""
+    return len(PdfReader(pdf_file_path).pages)
+
+def extract_text_from_pages(pdf_file_path, first_page, last_page):
+    """
+    Hybrid per-page extraction of pages first_page..last_page (1-based, inclusive), one string per page.
+    Pages with a usable text layer are read with pypdf; only pages with fewer than
+    MIN_PAGE_TEXT_CHARS characters are rasterized (one at a time) and OCR'd.
+    - A page whose OCR fails (e.g. poppler or Tesseract missing) keeps its pypdf text.
+    """
     reader = PdfReader(pdf_file_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""  # Handle pages without text (e.g., images)
-    return text.strip()
-
-def extract_text_from_pdf_using_ocr(pdf_file_path):
-    """Convert PDF to images and extract text from each page using Tesseract OCR."""
-    pages = convert_from_path(pdf_file_path)
-    text = ""
-    for page in pages:
-        text += pytesseract.image_to_string(page)
-    return text
-
-def handle_large_text(text):
-    """Handle large text by splitting it into smaller parts and summarizing each."""
-    # Split text into smaller parts if it exceeds the character limit
-    chunks = [text[i:i + CHARACTER_LIMIT] for i in range(0, len(text), CHARACTER_LIMIT)]
-    
-    full_summary = ""
-    for chunk in chunks:
-        summary = generate_short_summary(chunk)
-        full_summary += summary + "\n\n"
-    
-    return full_summary.strip()
+    texts = []
+    for number in range(first_page, last_page + 1):
+        text = reader.pages[number - 1].extract_text() or ""
+        if len(text.strip()) < MIN_PAGE_TEXT_CHARS:
+            try:
+                ocr_text = ocr_pdf_page(pdf_file_path, number)
+            except Exception:
+                logger.exception("OCR of page %d of %s failed; keeping its text layer", number, pdf_file_path)
+                ocr_text = ""
+            if len(ocr_text.strip()) > len(text.strip()):
+                text = ocr_text
+        texts.append(text)
+    return texts
+
+def split_text(text, limit=CHARACTER_LIMIT):
+    """
+    Split text into chunks of at most `limit` characters.
+    Chunks break on paragraph boundaries, then sentence boundaries, and only
+    fall back to whitespace or raw offsets for single oversized sentences.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= limit:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            while len(sentence) > limit:
+                cut = sentence.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            pieces.append(sentence)
+
+    # Pack the pieces greedily into chunks that stay within the limit
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if len(candidate) <= limit:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = piece
+    if current:
+        chunks.append(current)
+    return chunks
 
-def generate_short_summary(text):
+def summary_messages(text, max_words=None):
+    if max_words is not None:
+        return [{'role': 'user', 'content': f"Summarize this text in at most {max_words} words: {text}"}]
+    return [{'role': 'user', 'content': f"Summarize this text: {text}"}]
+
+def summary_cache_key(text, max_words=None):
+    if max_words is not None:
+        return cache_key("brief", model, str(max_words), text)
+    return cache_key("summary", model, text)
+
+async def generate_short_summary_async(text, client, semaphore, cache=None, max_words=None):
+    """
+    Summarize one piece of text with the LLM client (see app.utils.llm), bounded by `semaphore`.
+    With `max_words` the model is asked to keep the summary that short.
+    With a `cache` (see app.utils.summary_cache) results are keyed by model, length limit and text hash.
+    """
+    key = summary_cache_key(text, max_words) if cache is not None else None
+    if key is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached
+    async with semaphore:
+        summary = await client.chat(model, summary_messages(text, max_words))
+    if key is not None:
+        await asyncio.to_thread(cache.set, key, summary)
+    return summary
+
+async def summarize_text(text, client=None, concurrency=SUMMARY_CONCURRENCY, limit=CHARACTER_LIMIT, cache=None):
+    """
+    Map-reduce summarization of arbitrarily long text.
+    - Map: split the text on paragraph/sentence boundaries and summarize the chunks concurrently.
+    - Reduce: join the partial summaries and repeat until they fit in `limit`, then summarize once more.
+    - With a `cache`, every chunk and reduce step is reused across calls.
+    """
+    client = client or get_llm_client()
+    # Bounds this document's share of the client's process-wide concurrency
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aclosing(reduce_text(text, client, semaphore, limit, cache)) as rounds:
+        async for event, data in rounds:
+            if event == "text":
+                text = data
+    return await generate_short_summary_async(text, client, semaphore, cache)
+
+async def reduce_text(text, client, semaphore, limit=CHARACTER_LIMIT, cache=None):
+    """
+    The reduce rounds shared by summarize_text and summarize_text_events. Yields
+    ("chunk", {"round", "index", "total", "summary"}) for every chunk summary, then
+    ("text", reduced) once the joined summaries fit in `limit`.
+    - A round whose summaries do not shrink the text is redone asking each chunk for at
+      most its share of `limit`, in words.
+    - Only if those still do not shrink it is the text past `limit` dropped (logged as a warning).
+    """
+    round_number = 0
+    max_words = None
+    while len(text) > limit:
+        round_number += 1
+        chunks = split_text(text, limit)
+        summaries = [""] * len(chunks)
+        async with aclosing(summarize_chunks(chunks, client, semaphore, cache, max_words)) as results:
+            async for index, summary in results:
+                summaries[index] = summary
+                yield "chunk", {"round": round_number, "index": index, "total": len(chunks), "summary": summary}
+        reduced = "\n\n".join(summary.strip() for summary in summaries)
+        if len(reduced) < len(text):
+            text = reduced
+        elif max_words is None:
+            # Redo the round asking every chunk for its share of the limit
+            max_words = max(MIN_BRIEF_SUMMARY_WORDS, limit // len(chunks) // BRIEF_SUMMARY_CHARS_PER_WORD)
+            logger.warning(
+                "Summaries of %d chunks did not shrink the text (%d -> %d chars); asking for at most %d words each",
+                len(chunks), len(text), len(reduced), max_words,
+            )
+        else:
+            logger.warning(
+                "Brief summaries did not shrink the text either (%d -> %d chars); dropping %d chars past the limit",
+                len(text), len(reduced), len(reduced) - limit,
+            )
+            text = reduced[:limit]
+    yield "text", text
+
+async def summarize_chunks(chunks, client, semaphore, cache=None, max_words=None):
+    """
+    Yield (index, summary) for each chunk as soon as its summary is ready.
+    Summaries still pending when the consumer stops (or is cancelled) are cancelled.
+    """
+    tasks = [asyncio.ensure_future(generate_short_summary_async(chunk, client, semaphore, cache, max_words)) for chunk in chunks]
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=tasks.index):
+                yield tasks.index(task), task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def stream_short_summary(text, client, semaphore, cache=None):
+    """
+    Summarize one piece of text, yielding the summary piece by piece as Ollama streams it.
+    Shares cache entries with generate_short_summary_async (a cached summary is yielded whole).
+    """
+    key = summary_cache_key(text) if cache is not None else None
+    if key is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    async with semaphore:
+        async with aclosing(client.stream_chat(model, summary_messages(text))) as stream:
+            async for content in stream:
+                parts.append(content)
+                yield content
+    if key is not None:
+        await asyncio.to_thread(cache.set, key, "".join(parts))
+
+async def summarize_text_events(text, client=None, concurrency=SUMMARY_CONCURRENCY, limit=CHARACTER_LIMIT, cache=None):
+    """
+    Streaming variant of summarize_text yielding (event, data) pairs as the work progresses:
+    - ("chunk", {"round", "index", "total", "summary"}) whenever a chunk summary of a reduce round is ready,
+    - ("delta", {"content"}) for every piece of the final summary as the model generates it,
+    - ("final", {"summary"}) with the complete final summary.
+    Closing or cancelling the generator cancels the Ollama calls still in flight.
+    """
+    client = client or get_llm_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aclosing(reduce_text(text, client, semaphore, limit, cache)) as rounds:
+        async for event, data in rounds:
+            if event == "text":
+                text = data
+            else:
+                yield event, data
+
+    parts = []
+    async with aclosing(stream_short_summary(text, client, semaphore, cache)) as pieces:
+        async for content in pieces:
+            parts.append(content)
+            yield "delta", {"content": content}
+    yield "final", {"summary": "".join(parts)}
+
+async def generate_short_summary(text, client=None):
     """Pass the extracted text to the local Llama 3 API for a short summary."""
-    response = ollama.chat(model=model, messages=[{'role': 'user', 'content': f"Summarize this text: {text}"}])
-    return response['message']['content']
+    return await (client or get_llm_client()).chat(model, summary_messages(text))
 
 
 
 
-def get_llama_recommendations(user_reviews: List[dict], books: List[dict]) -> List[dict]:
+async def get_llama_recommendations(user_reviews: List[dict], books: List[dict], client=None) -> List[dict]:
     """
-    Send user reviews and all book summaries to Llama for recommendations.
-    The input is a list of user reviews and book summaries.
+    Send user reviews and candidate book summaries to Llama for recommendations.
+    The input is a list of user reviews and book summaries (best candidates first),
+    trimmed to RECOMMENDATION_PROMPT_TOKENS by app.utils.prompts.
     Llama will return a list of recommended book IDs in JSON format.
     """
 
-    # Combine user reviews and book summaries into a message for Llama
-    user_reviews_text = "\n".join([f"Review for book id {review['book_id']}: review {review['review_text']}" for review in user_reviews])
-    book_summaries_text = "\n".join([f"book id {book['book_id']}: summary {book['summary']}" for book in books])
+    # Fit the most telling reviews and the best candidates into the prompt's token budget
+    prompt = build_recommendation_prompt(user_reviews, books).prompt
 
-    # Create a prompt for Llama, instructing it to return a JSON response with book_ids
-    prompt = f"""
-    Recommend a book that aligns with the user's preferences based on their past reviews and reading history. Analyze the themes, genres, and writing style from their previous reviews, and suggest a book that matches those elements. Additionally, consider the key highlights and themes from the provided book summary to ensure the recommendation fits the user's interests and literary tastes.
-    Here are some book reviews by a user:
-    {user_reviews_text}
-    
-    Here are the summaries of available books:
-    {book_summaries_text}
-    
-    Based on the user's reviews, please recommend books from the list of available books.
-    Provide the recommendations in the following JSON format:
-    {{
-        "book_id": <book_id>
-    }}
-    """
-    
-    # Call the Llama model using ollama's chat function
-    response = ollama.chat(model=model, messages=[{'role': 'user', 'content': prompt}])
-    
-    # Process the response from Llama
-    response_text = response.get("content", "")
+    # Call the Llama model through the shared LLM client
+    response_text = await (client or get_llm_client()).chat(model, [{'role': 'user', 'content': prompt}])
     
     # Example expected response: [{"book_id": 1}, {"book_id": 3}]
     try:
@@ -94,8 +267,11 @@ def get_llama_recommendations(user_reviews: List[dict], books: List[dict]) -> Li
         recommendations = json.loads(response_text)
     except json.JSONDecodeError:
         # In case of an invalid or unexpected response format, return an empty list or log the error
-        print(f"Error decoding Llama response: {response_text}")
+        logger.warning("Error decoding Llama response: %s", response_text)
         recommendations = [{"book_id": 0}]
+    # The prompt asks for a single {"book_id": ...} object
+    if isinstance(recommendations, dict):
+        recommendations = [recommendations]
 
     return recommendations
 
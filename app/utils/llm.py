@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence
+import httpx
+import ollama
+from dotenv import load_dotenv
+from app.utils.telemetry import timed
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# "ollama" talks to the Ollama server (OLLAMA_HOST), "fake" answers in-process (tests, benchmarks)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "ollama")
+# Generations running at once across the whole process; match the server's OLLAMA_NUM_PARALLEL
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", 4))
+# Upper bound on one non-streamed call, and on the wait for each piece of a streamed one
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", 300))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("LLM_CONNECT_TIMEOUT_SECONDS", 5))
+# Retries of calls that failed with a connection error, timeout, 429 or 5xx
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BACKOFF_SECONDS = float(os.environ.get("LLM_RETRY_BACKOFF_SECONDS", 0.5))
+
+RETRYABLE_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+Messages = Sequence[dict]
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    # ollama raises ConnectionError when the server cannot be reached
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class OllamaBackend:
+    """Chat and embedding calls over one pooled ollama.AsyncClient (keep-alive connections to the server)."""
+
+    def __init__(self, client: Optional[ollama.AsyncClient] = None, concurrency: int = LLM_CONCURRENCY):
+        self.client = client or ollama.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def chat(self, model: str, messages: Messages) -> str:
+        response = await self.client.chat(model=model, messages=messages)
+        return response['message']['content']
+
+    async def stream_chat(self, model: str, messages: Messages) -> AsyncIterator[str]:
+        stream = await self.client.chat(model=model, messages=messages, stream=True)
+        async for part in stream:
+            if part['message']['content']:
+                yield part['message']['content']
+
+    async def embed(self, model: str, texts: Sequence[str]) -> List[List[float]]:
+        response = await self.client.embed(model=model, input=list(texts))
+        return response['embeddings']
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+
+class FakeBackend:
+    """
+    In-process stand-in for the model server: waits `latency` seconds per call and answers
+    with `reply(messages)` (a short deterministic summary by default). Streams split the
+    answer into words; embeddings are deterministic word-hash vectors of `dimensions` floats.
+    `calls` counts the requests it served.
+    """
+
+    def __init__(self, latency: float = 0.0, reply: Optional[Callable[[Messages], str]] = None, dimensions: int = 64):
+        self.latency = latency
+        self.reply = reply or (lambda messages: f"Summary of {len(messages[-1]['content'])} characters.")
+        self.dimensions = dimensions
+        self.calls = 0
+
+    async def chat(self, model: str, messages: Messages) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.reply(messages)
+
+    async def stream_chat(self, model: str, messages: Messages) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self.reply(messages).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+    async def embed(self, model: str, texts: Sequence[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for word in text.lower().split():
+                vector[int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), "little") % self.dimensions] += 1.0
+            vectors.append(vector)
+        return vectors
+
+    async def aclose(self) -> None:
+        pass
+
+
+class LLMClient:
+    """
+    The process-wide LLM client every summary, recommendation and embedding call goes through.
+    - At most `concurrency` calls are in flight at once; callers beyond that queue here
+      instead of on the model server.
+    - Each call (each streamed piece) is bounded by `timeout`.
+    - Connection errors, timeouts, 429 and 5xx answers are retried up to `max_retries` times
+      with exponential backoff; a stream is only retried before its first piece arrived.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        concurrency: int = LLM_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_RETRY_BACKOFF_SECONDS,
+    ):
+        self.backend = backend or OllamaBackend(concurrency=concurrency)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.in_flight = 0
+        self.retries = 0
+        self.failures = 0
+
+    async def _acquire(self) -> None:
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    async def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            self.failures += 1
+            return False
+        self.retries += 1
+        delay = self.backoff * 2 ** attempt
+        logger.warning("LLM call failed (%r), retrying in %.1fs", error, delay)
+        await asyncio.sleep(delay)
+        return True
+
+    async def _call(self, call: Callable[[], Awaitable]):
+        """Run one non-streamed backend call under the concurrency limit, timeout and retries."""
+        attempt = 0
+        while True:
+            await self._acquire()
+            try:
+                with timed("llm"):
+                    async with asyncio.timeout(self.timeout):
+                        return await call()
+            except Exception as e:
+                error = e
+            finally:
+                self._release()
+            if not await self._should_retry(error, attempt):
+                raise error
+            attempt += 1
+
+    async def chat(self, model: str, messages: Messages) -> str:
+        """The model's complete answer to `messages`."""
+        return await self._call(lambda: self.backend.chat(model, messages))
+
+    async def embed(self, model: str, texts: Sequence[str]) -> List[List[float]]:
+        """One embedding vector per text, from the embedding `model`."""
+        return await self._call(lambda: self.backend.embed(model, texts))
+
+    async def stream_chat(self, model: str, messages: Messages) -> AsyncIterator[str]:
+        """The model's answer to `messages`, piece by piece as it is generated."""
+        attempt = 0
+        while True:
+            received = False
+            await self._acquire()
+            try:
+                with timed("llm"):
+                    stream = self.backend.stream_chat(model, messages)
+                    try:
+                        while True:
+                            async with asyncio.timeout(self.timeout):
+                                try:
+                                    piece = await anext(stream)
+                                except StopAsyncIteration:
+                                    return
+                            received = True
+                            yield piece
+                    finally:
+                        await stream.aclose()
+            except Exception as e:
+                if received:
+                    self.failures += 1
+                    raise
+                error = e
+            finally:
+                self._release()
+            if not await self._should_retry(error, attempt):
+                raise error
+            attempt += 1
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    async def __aenter__(self) -> "LLMClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
+
+
+def create_backend():
+    if LLM_BACKEND == "fake":
+        return FakeBackend()
+    return OllamaBackend()
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """The shared client; main.py's lifespan opens it, scripts and tests get one on first use."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient(create_backend())
+    return _llm_client
+
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    """Replace the shared client (e.g. with one over a FakeBackend)."""
+    global _llm_client
+    _llm_client = client
+
+
+async def close_llm_client() -> None:
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
@@ -1,8 +1,21 @@
 # app/utils/password.py
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from dotenv import load_dotenv
+from app.utils.telemetry import timed
+
+load_dotenv()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt work runs on a bounded pool instead of the event loop
+PASSWORD_POOL = os.environ.get("PASSWORD_POOL", "thread")  # "thread" or "process"
+PASSWORD_POOL_WORKERS = int(os.environ.get("PASSWORD_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_POOL_MAX_QUEUE = int(os.environ.get("PASSWORD_POOL_MAX_QUEUE", 64))
+
 def secure_pwd(password: str) -> str:
     """
     Hashes a password using bcrypt.
@@ -14,3 +27,73 @@ def verify_pwd(plain_password: str, hashed_password: str) -> bool:
     Verifies if a plain password matches the hashed password.
     """
     return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification on a thread or process pool.
+    - At most `workers` bcrypt calls run at once; the rest wait in the pool's queue.
+    - Once `max_queue` calls are waiting, new calls are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 4, max_queue: int = 64):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._executor: Executor = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submitted calls still waiting for a free worker."""
+        return max(0, self.in_flight - self.workers)
+
+    async def _run(self, func, *args):
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many password operations in progress, retry shortly")
+        self.in_flight += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            with timed("auth"):
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(secure_pwd, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_pwd, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(PASSWORD_POOL, PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_QUEUE)
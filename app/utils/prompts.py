@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+from typing import List, NamedTuple, Sequence, Tuple
+from dotenv import load_dotenv
+from app.utils.telemetry import prompt_build_duration, prompt_tokens
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Token budget of the whole recommendation prompt (instructions, reviews and summaries)
+RECOMMENDATION_PROMPT_TOKENS = int(os.environ.get("RECOMMENDATION_PROMPT_TOKENS", 3000))
+# Longer book summaries and review texts are cut to this many tokens
+PROMPT_SUMMARY_TOKENS = int(os.environ.get("PROMPT_SUMMARY_TOKENS", 200))
+PROMPT_REVIEW_TOKENS = int(os.environ.get("PROMPT_REVIEW_TOKENS", 120))
+# "heuristic" (about four characters per token) or "tiktoken" (needs the tiktoken package)
+PROMPT_TOKENIZER = os.environ.get("PROMPT_TOKENIZER", "heuristic")
+
+# Share of the budget left after the instructions that reviews may use; books get the rest
+REVIEW_SHARE = 0.4
+# Ratings further from the middle of the 1-5 scale say more about the user's taste
+RATING_MIDPOINT = 3.0
+ELLIPSIS = "…"
+
+RECOMMENDATION_PROMPT = """Recommend a book that aligns with the user's preferences based on their past reviews and reading history. Analyze the themes, genres, and writing style from their previous reviews, and suggest a book that matches those elements. Additionally, consider the key highlights and themes from the provided book summary to ensure the recommendation fits the user's interests and literary tastes.
+Here are some book reviews by a user:
+{reviews}
+
+Here are the summaries of available books:
+{books}
+
+Based on the user's reviews, please recommend books from the list of available books.
+Provide the recommendations in the following JSON format:
+{{
+    "book_id": <book_id>
+}}
+"""
+
+
+class HeuristicTokenizer:
+    """Estimates about four characters per token, close to BPE vocabularies on English prose; O(1)."""
+
+    chars_per_token = 4
+
+    def count(self, text: str) -> int:
+        return -(-len(text) // self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        limit = max_tokens * self.chars_per_token
+        if len(text) <= limit:
+            return text
+        if limit <= len(ELLIPSIS):
+            return ""
+        # Cut on a word boundary when there is one
+        cut = text.rfind(" ", 0, limit - len(ELLIPSIS) + 1)
+        return text[:cut if cut > 0 else limit - len(ELLIPSIS)].rstrip() + ELLIPSIS
+
+
+class TiktokenTokenizer:
+    """Exact counts for tiktoken encodings (imported lazily, only when selected)."""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        keep = max_tokens - len(self.encoding.encode(ELLIPSIS))
+        return self.encoding.decode(tokens[:keep]) + ELLIPSIS if keep > 0 else ""
+
+
+def create_tokenizer():
+    if PROMPT_TOKENIZER == "tiktoken":
+        return TiktokenTokenizer()
+    return HeuristicTokenizer()
+
+
+default_tokenizer = create_tokenizer()
+
+
+class PromptBuild(NamedTuple):
+    prompt: str
+    tokens: int
+    reviews_used: int
+    books_used: int
+
+
+def review_priority(reviews: Sequence[dict]) -> List[dict]:
+    """
+    Reviews in the order they are worth including: alternately the most recent (highest id,
+    else latest in the list) and the most extreme rating, skipping ones already taken.
+    """
+    recency = [review.get("id", position) for position, review in enumerate(reviews)]
+    recent = sorted(range(len(reviews)), key=lambda i: -recency[i])
+    extreme = sorted(range(len(reviews)), key=lambda i: (-abs(reviews[i]["rating"] - RATING_MIDPOINT), -recency[i]))
+    order, taken = [], set()
+    for pair in zip(recent, extreme):
+        for i in pair:
+            if i not in taken:
+                taken.add(i)
+                order.append(reviews[i])
+    return order
+
+
+def review_line(review: dict, text_tokens: int, tokenizer) -> str:
+    return (
+        f"Review for book id {review['book_id']} (rating {review['rating']:g}): review "
+        f"{tokenizer.truncate(review['review_text'] or '', text_tokens)}"
+    )
+
+
+def book_line(book: dict, summary_tokens: int, tokenizer) -> str:
+    return f"book id {book['book_id']}: summary {tokenizer.truncate(book['summary'] or '', summary_tokens)}"
+
+
+def empty_line_cost(line, item: dict, text_field: str, tokenizer) -> int:
+    """Tokens of `item`'s line with an empty text, about the fixed part of every line of its kind."""
+    return tokenizer.count(line({**item, text_field: ""}, 0, tokenizer) + "\n")
+
+
+def fit(items: Sequence[dict], line, text_field: str, text_tokens: int, budget: int, tokenizer) -> Tuple[List[str], int]:
+    """
+    The lines of `items` (in order, skipping any that no longer fit) whose tokens add up to at
+    most `budget`, texts cut to `text_tokens`.
+    """
+    kept, used = [], 0
+    if not items:
+        return kept, used
+    overhead = empty_line_cost(line, items[0], text_field, tokenizer)
+    for item in items:
+        # Estimate first (within a token or two): lines that clearly cannot fit are not rendered
+        if used + overhead + min(text_tokens, tokenizer.count(item[text_field] or "")) - 1 > budget:
+            continue
+        rendered = line(item, text_tokens, tokenizer)
+        cost = tokenizer.count(rendered + "\n")
+        if used + cost <= budget:
+            kept.append(rendered)
+            used += cost
+    return kept, used
+
+
+def build_recommendation_prompt(
+    user_reviews: Sequence[dict], books: Sequence[dict], budget: int = RECOMMENDATION_PROMPT_TOKENS, tokenizer=None
+) -> PromptBuild:
+    """
+    The recommendation prompt for `user_reviews` and the candidate `books` (best candidates first),
+    fitted to `budget` tokens; the same inputs always give the same prompt.
+    - Summaries and review texts are cut to PROMPT_SUMMARY_TOKENS / PROMPT_REVIEW_TOKENS.
+    - Reviews get up to REVIEW_SHARE of the budget, most recent and most extreme ratings first.
+    - Books fill the rest in candidate order; the best candidate is always included, its
+      summary shortened further if that is what it takes.
+    """
+    start = time.perf_counter()
+    tokenizer = tokenizer or default_tokenizer
+    available = max(0, budget - tokenizer.count(RECOMMENDATION_PROMPT.format(reviews="", books="")))
+
+    kept_reviews, used = fit(
+        review_priority(user_reviews), review_line, "review_text", PROMPT_REVIEW_TOKENS, int(available * REVIEW_SHARE), tokenizer
+    )
+    kept_books, _ = fit(books, book_line, "summary", PROMPT_SUMMARY_TOKENS, available - used, tokenizer)
+    if books and not kept_books:
+        overhead = empty_line_cost(book_line, books[0], "summary", tokenizer)
+        kept_books = [book_line(books[0], max(0, available - used - overhead), tokenizer)]
+
+    prompt = RECOMMENDATION_PROMPT.format(reviews="\n".join(kept_reviews), books="\n".join(kept_books))
+    build = PromptBuild(prompt, tokenizer.count(prompt), len(kept_reviews), len(kept_books))
+    prompt_tokens.observe(build.tokens, "recommendation")
+    prompt_build_duration.observe(time.perf_counter() - start, "recommendation")
+    return build
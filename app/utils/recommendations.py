@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+import sys
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from dotenv import load_dotenv
+from app.db import AsyncSessionLocal
+from app.models import CatalogRevision, Review
+from app.utils.cache import TTLCache
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 10000))
+RECOMMENDATION_CACHE_TTL_SECONDS = int(os.environ.get("RECOMMENDATION_CACHE_TTL_SECONDS", 24 * 3600))
+# Serve a stale cached answer immediately and refresh it in the background
+RECOMMENDATION_SWR = os.environ.get("RECOMMENDATION_SWR", "false").lower() == "true"
+
+# user id -> (version stamp, recommendations)
+recommendation_cache = TTLCache(maxsize=RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL_SECONDS)
+# Users whose recommendations are being refreshed in the background
+_refreshing = set()
+_refresh_tasks = set()
+
+
+async def recommendation_stamp(db: AsyncSession, user_id: int) -> tuple:
+    """
+    Version of a user's recommendation inputs: their latest review id and the catalog revision
+    stored in the database (so the stamp means the same on every worker), in one query.
+    """
+    latest_review = select(func.max(Review.id)).where(Review.user_id == user_id).scalar_subquery()
+    result = await db.execute(select(latest_review, CatalogRevision.catalog).where(CatalogRevision.id == 1))
+    row = result.one_or_none()
+    return tuple(row) if row else (None, 0)
+
+
+async def _refresh(user_id: int, compute: Callable[[AsyncSession, int], Awaitable[list]]) -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            stamp = await recommendation_stamp(db, user_id)
+            recommendation_cache.set(user_id, (stamp, await compute(db, user_id)))
+    except Exception:
+        logger.exception("Background recommendation refresh failed for user %s", user_id)
+    finally:
+        _refreshing.discard(user_id)
+
+
+def schedule_refresh(user_id: int, compute: Callable[[AsyncSession, int], Awaitable[list]]) -> None:
+    if user_id in _refreshing:
+        return
+    _refreshing.add(user_id)
+    task = asyncio.create_task(_refresh(user_id, compute))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def cached_recommendations(
+    db: AsyncSession,
+    user_id: int,
+    compute: Callable[[AsyncSession, int], Awaitable[list]],
+    stale_while_revalidate: Optional[bool] = None,
+) -> list:
+    """
+    Return the user's recommendations from the cache when their stamp is unchanged.
+    - On a stamp mismatch the answer is recomputed, or, in stale-while-revalidate mode,
+      the stale answer is returned at once and recomputed in the background.
+    """
+    if stale_while_revalidate is None:
+        stale_while_revalidate = RECOMMENDATION_SWR
+    stamp = await recommendation_stamp(db, user_id)
+    entry = recommendation_cache.get(user_id)
+    if entry is not None:
+        cached_stamp, recommendations = entry
+        if cached_stamp == stamp:
+            return recommendations
+        if stale_while_revalidate:
+            schedule_refresh(user_id, compute)
+            return recommendations
+    recommendations = await compute(db, user_id)
+    recommendation_cache.set(user_id, (stamp, recommendations))
+    return recommendations
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import sys
+from collections import defaultdict
+from typing import Hashable, NamedTuple, Optional
+from fastapi import Request, Response
+from dotenv import load_dotenv
+from app.utils.cache import TTLCache
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Serialized responses of book reads; 0 disables the cache (ETags and 304s still work)
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 10000))
+# Writes in this process invalidate entries right away; the TTL bounds how long writes made
+# through other worker processes can go unnoticed
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 30))
+
+# Responses are per user session data: only the client may keep them, and must revalidate
+CACHE_CONTROL = "private, no-cache"
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+    headers: dict
+
+
+class ResponseCache:
+    """
+    Serialized JSON responses keyed by route and arguments, each with a strong ETag.
+    - Entries tagged with a book id are dropped by invalidate_book(); a response computed
+      from a read that started before the invalidation is not stored.
+    - Counts 304 answers alongside the underlying cache's hit/miss counters.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float]):
+        self.entries = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self.enabled = maxsize > 0
+        self.not_modified = 0
+        self._generations = defaultdict(int)
+
+    def generation(self, book_id: Optional[int]) -> int:
+        """Call before reading the database; pass the result to store()."""
+        return self._generations[book_id] if book_id is not None else 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        return self.entries.get(key) if self.enabled else None
+
+    def store(self, key: Hashable, entry: CachedResponse, book_id: Optional[int] = None, generation: int = 0) -> CachedResponse:
+        if self.enabled and (book_id is None or self._generations[book_id] == generation):
+            self.entries.set(key, entry)
+        return entry
+
+    def invalidate_book(self, book_id: int) -> None:
+        self._generations[book_id] += 1
+        self.entries.pop(("book", book_id))
+        self.entries.pop(("summary", book_id))
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), "not_modified": self.not_modified}
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the version information a response was built from."""
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def cached_json_response(request: Request, entry: CachedResponse) -> Response:
+    """304 when the client already has this version, otherwise the cached body."""
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request, entry.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers={**headers, **entry.headers})
@@ -0,0 +1,140 @@
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models import Book
+from app.utils.catalog import stored_catalog_revision
+
+# Relative weight of each field, matching the A/B/C weights the Postgres trigger assigns
+# (ts_rank's defaults: A=1.0, B=0.4, C=0.2)
+FIELD_WEIGHTS = {"title": 1.0, "author": 1.0, "genre": 0.4, "summary": 0.2}
+TEXT_SEARCH_CONFIG = "english"
+
+# Common words that the "english" text search configuration drops as well
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [token for token in re.findall(r"[a-z0-9]+", (text or "").lower()) if token not in STOPWORDS]
+
+
+def rank_order(item: Tuple[int, float]) -> tuple:
+    book_id, score = item
+    return -score, book_id
+
+
+class InvertedIndex:
+    """
+    In-memory full-text index used when the database is not Postgres (SQLite test runs).
+    Scores documents containing every query term by field-weighted term frequency times
+    inverse document frequency. Built lazily from the database and then kept current
+    with upsert/remove as books are created, updated and deleted; rebuilt when the stored
+    catalog revision differs from the one it was built at (writes by other workers, CLI imports).
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.terms: Dict[int, List[str]] = {}
+        self.loaded = False
+        # Stored catalog revision the index was built at
+        self.revision: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def rebuild(self, books) -> None:
+        self.invalidate()
+        for book in books:
+            self._add(book)
+        self.loaded = True
+
+    def invalidate(self) -> None:
+        """Forget all documents; the index is rebuilt from the database on next use."""
+        self.postings, self.terms, self.loaded, self.revision = defaultdict(dict), {}, False, None
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        revision = await stored_catalog_revision(db)
+        if self.loaded and revision == self.revision:
+            return
+        result = await db.execute(select(Book.id, Book.title, Book.author, Book.genre, Book.summary))
+        self.rebuild(result.all())
+        self.revision = revision
+
+    def upsert(self, book) -> None:
+        if not self.loaded:
+            return  # the first ensure_loaded() picks the book up
+        self.remove(book.id)
+        self._add(book)
+
+    def remove(self, book_id: int) -> None:
+        for term in self.terms.pop(book_id, ()):
+            postings = self.postings[term]
+            postings.pop(book_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def _add(self, book) -> None:
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(book, field)):
+                weights[token] += weight
+        for term, weight in weights.items():
+            self.postings[term][book.id] = weight
+        self.terms[book.id] = list(weights)
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """The top `k` (all by default) (book_id, score) pairs matching every query term, best first, ties by id."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or any(term not in self.postings for term in terms):
+            return []
+        # Intersect starting from the rarest term
+        terms.sort(key=lambda term: len(self.postings[term]))
+        matches = set(self.postings[terms[0]])
+        for term in terms[1:]:
+            matches.intersection_update(self.postings[term])
+        total = len(self.terms)
+        scores = {book_id: 0.0 for book_id in matches}
+        for term in terms:
+            postings = self.postings[term]
+            idf = math.log(1 + total / len(postings))
+            for book_id in matches:
+                scores[book_id] += postings[book_id] * idf
+        if k is None:
+            return sorted(scores.items(), key=rank_order)
+        return heapq.nsmallest(k, scores.items(), key=rank_order)
+
+
+search_index = InvertedIndex()
+
+
+async def search_books(db: AsyncSession, q: str, columns, limit: int, offset: int = 0) -> list:
+    """
+    Rows of `columns` for books matching `q`, best match first, `limit` rows from `offset`.
+    Postgres ranks with ts_rank_cd over the trigger-maintained books.search_vector (GIN indexed);
+    other databases use the in-memory inverted index.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, q)
+        rank = func.ts_rank_cd(Book.search_vector, tsquery)
+        query = (
+            select(*columns)
+            .where(Book.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), Book.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        return (await db.execute(query)).all()
+
+    await search_index.ensure_loaded(db)
+    ranked = [book_id for book_id, _ in search_index.search(q, offset + limit)[offset:]]
+    if not ranked:
+        return []
+    result = await db.execute(select(*columns).where(Book.id.in_(ranked)))
+    rows = {row.id: row for row in result.all()}
+    return [rows[book_id] for book_id in ranked if book_id in rows]
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Local directory and size budget for cached PDF text and summaries (0 disables the cache)
+SUMMARY_CACHE_DIR = os.environ.get("SUMMARY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "jktech-summary-cache"))
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get("SUMMARY_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+def cache_key(*parts: str) -> str:
+    """Content-addressed key: SHA-256 over the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of text values stored as files on local disk.
+    - Reads refresh a file's mtime, which is the recency used for eviction.
+    - When the total size goes over `max_bytes`, the least recently used files are
+      removed until it is back under 90% of the budget.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(entry[2] for entry in self._entries())
+        return self._size
+
+    def _entries(self):
+        """(mtime, path, size) for every cached file."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith(".tmp-"):
+                        continue  # write in progress
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as cached_file:
+                value = cached_file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = value.encode("utf-8")
+        # Write to a temporary file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        with self._lock:
+            size = self._current_size()
+            if os.path.exists(path):
+                size -= os.path.getsize(path)
+            os.replace(temp_path, path)
+            self._size = size + len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        target = self.max_bytes * 0.9
+        for _, path, size in sorted(self._entries()):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+summary_cache = DiskCache(SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES)
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import UploadFile
+from dotenv import load_dotenv
+from app.utils.cache import TTLCache
+from app.utils import helper
+from app.utils.summary_cache import cache_key, summary_cache
+from app.utils.telemetry import timed
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Processes used for page-level text extraction and OCR
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+# How long finished jobs stay available to the polling endpoint
+SUMMARY_JOB_RETENTION_SECONDS = int(os.environ.get("SUMMARY_JOB_RETENTION_SECONDS", 3600))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# job id -> job state dict
+jobs = TTLCache(maxsize=10000, ttl=SUMMARY_JOB_RETENTION_SECONDS)
+# Strong references to running jobs so they are not garbage collected mid-flight
+_running_tasks = set()
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pdf_pool
+
+
+def shutdown_pdf_pool() -> None:
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+async def save_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Copy an upload to a named temporary file chunk by chunk, without holding it in memory.
+    Returns the file path and the SHA-256 of its bytes.
+    """
+    loop = asyncio.get_running_loop()
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                await loop.run_in_executor(None, temp_file.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def final_summary_key(file_digest: str) -> str:
+    """Cache key of a document's final summary; chunk summaries are cached by their own text."""
+    return cache_key("final", helper.model, str(helper.CHARACTER_LIMIT), file_digest)
+
+
+def page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split pages 1..page_count into at most `parts` contiguous (first, last) ranges."""
+    parts = max(1, min(parts, page_count))
+    size, extra = divmod(page_count, parts)
+    ranges, first = [], 1
+    for i in range(parts):
+        last = first + size - 1 + (1 if i < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+
+async def extract_text(pdf_file_path: str) -> str:
+    """Extract the PDF text page by page across the process pool, OCR-ing only scanned pages."""
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
+    page_count = await loop.run_in_executor(None, helper.count_pdf_pages, pdf_file_path)
+    if not page_count:
+        return ""
+    # Pages are extracted (pypdf, plus OCR for scanned pages) in worker processes, so their
+    # time is recorded here as one "pdf" span
+    with timed("pdf"):
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, helper.extract_text_from_pages, pdf_file_path, first, last)
+            # Several small ranges per worker balance the load when scanned pages cluster together
+            for first, last in page_ranges(page_count, PDF_WORKERS * 4)
+        ))
+    return "\n\n".join(page.strip() for part in parts for page in part if page.strip())
+
+
+async def document_text(pdf_file_path: str, file_digest: str) -> str:
+    """The PDF's extracted text, reused from the cache for documents seen before."""
+    text_key = cache_key("text", file_digest)
+    extracted_text = await asyncio.to_thread(summary_cache.get, text_key)
+    if extracted_text is None:
+        extracted_text = await extract_text(pdf_file_path)
+        await asyncio.to_thread(summary_cache.set, text_key, extracted_text)
+    return extracted_text
+
+
+async def run_summary_job(job: dict, pdf_file_path: str, file_digest: str) -> None:
+    job["status"] = "running"
+    try:
+        extracted_text = await document_text(pdf_file_path, file_digest)
+        final_summary = await helper.summarize_text(extracted_text, cache=summary_cache)
+        await asyncio.to_thread(summary_cache.set, final_summary_key(file_digest), final_summary)
+        job["final_summary"] = final_summary
+        job["status"] = "done"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = time.time()
+        # Start the retention period when the job finishes, not when it was submitted
+        jobs.set(job["job_id"], job)
+        os.remove(pdf_file_path)
+
+
+async def submit_summary_job(pdf_file_path: str, file_digest: str, user_id: int) -> dict:
+    """
+    Register a summary job for an uploaded PDF and start it in the background; the job owns the file.
+    A document summarized before completes immediately from the cache.
+    """
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "status": "queued",
+        "final_summary": None,
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+    jobs.set(job["job_id"], job)
+
+    cached_summary = await asyncio.to_thread(summary_cache.get, final_summary_key(file_digest))
+    if cached_summary is not None:
+        os.remove(pdf_file_path)
+        job.update(status="done", final_summary=cached_summary, finished_at=time.time())
+        return job
+
+    task = asyncio.create_task(run_summary_job(job, pdf_file_path, file_digest))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return job
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_summary_events(pdf_file_path: str, file_digest: str) -> AsyncIterator[str]:
+    """
+    Server-Sent Events summarizing an uploaded PDF; the caller removes the file afterwards.
+    - "status" events as extraction and summarization start, so clients get bytes right away,
+    - "chunk" events as chunk summaries finish, "delta" events while the final summary is
+      generated and a "final" event with the complete summary ("error" if anything fails).
+    Cancelling the stream (Starlette does when the client disconnects) cancels the LLM calls in flight.
+    """
+    try:
+        cached_summary = await asyncio.to_thread(summary_cache.get, final_summary_key(file_digest))
+        if cached_summary is not None:
+            yield sse_event("final", {"summary": cached_summary})
+            return
+        yield sse_event("status", {"status": "extracting"})
+        extracted_text = await document_text(pdf_file_path, file_digest)
+        yield sse_event("status", {"status": "summarizing"})
+        async with aclosing(helper.summarize_text_events(extracted_text, cache=summary_cache)) as events:
+            async for event, data in events:
+                if event == "final":
+                    await asyncio.to_thread(summary_cache.set, final_summary_key(file_digest), data["summary"])
+                yield sse_event(event, data)
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
@@ -0,0 +1,185 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + '/../')
+load_dotenv()
+
+# Add a Server-Timing header (total, db, auth, llm, pdf) to every response
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+
+# Latency buckets in seconds (upper bounds; +Inf is implied)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Components whose time is attributed to the request that spent it
+COMPONENTS = ("db", "auth", "llm", "pdf")
+
+# Seconds spent per component by the current request (None outside of a request)
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram per label set."""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # One count per bucket plus +Inf, then the running sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = "{" + labels + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return "\n".join(lines)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.", ("method", "route", "status")
+)
+request_component_duration = Histogram(
+    "http_request_component_seconds", "Time a request spent in each component (db, auth, llm, pdf).", ("route", "component")
+)
+operation_duration = Histogram(
+    "operation_duration_seconds", "Duration of individual database statements, auth checks, LLM calls and PDF extractions.", ("component",)
+)
+
+prompt_tokens = Histogram(
+    "llm_prompt_tokens", "Estimated size of the prompts sent to the LLM, in tokens.", ("prompt",),
+    (256, 512, 1024, 2048, 4096, 8192, 16384, 32768),
+)
+prompt_build_duration = Histogram(
+    "llm_prompt_build_seconds", "Time spent building (fitting and rendering) LLM prompts.", ("prompt",),
+    (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+HISTOGRAMS = (request_duration, request_component_duration, operation_duration, prompt_tokens, prompt_build_duration)
+
+
+def record(component: str, seconds: float) -> None:
+    """Attribute `seconds` of `component` time to the current request, if any."""
+    operation_duration.observe(seconds, component)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[component] = timings.get(component, 0.0) + seconds
+
+
+@contextmanager
+def timed(component: str):
+    """Time the enclosed block (sync or async code) as `component`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(component, time.perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement executed through the engine as "db"."""
+    sync_engine = engine.sync_engine
+    if getattr(sync_engine, "_timed", False):
+        return
+    sync_engine._timed = True
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        record("db", time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            record("db", time.perf_counter() - starts.pop())
+
+
+def server_timing(total: float, timings: Dict[str, float]) -> str:
+    entries = [f"total;dur={total * 1000:.1f}"]
+    entries += [f"{component};dur={timings[component] * 1000:.1f}" for component in COMPONENTS if component in timings]
+    return ", ".join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording per-route latency and the db/auth/llm/pdf time of each request.
+    Routes are labelled by their path template (e.g. /books/{id}); unmatched paths share one label.
+    With SERVER_TIMING enabled the breakdown is also sent in a Server-Timing response header.
+    """
+
+    def __init__(self, app, server_timing_header: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing_header:
+                    header = server_timing(time.perf_counter() - start, timings)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            route = scope.get("route")
+            label = getattr(route, "path", "unmatched")
+            request_duration.observe(time.perf_counter() - start, scope["method"], label, str(status))
+            for component, seconds in timings.items():
+                request_component_duration.observe(seconds, label, component)
+
+
+def render_metrics() -> str:
+    """All histograms in the Prometheus text exposition format."""
+    return "\n".join(histogram.render() for histogram in HISTOGRAMS) + "\n"
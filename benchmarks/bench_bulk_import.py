@@ -0,0 +1,74 @@
+"""
+Rows/sec of the bulk import endpoint versus one POST /books/ per book.
+
+    python benchmarks/bench_bulk_import.py --database-url sqlite+aiosqlite:///./bench.db --rows 20000
+"""
+import asyncio
+import json
+import time
+
+from common import app_client, base_parser, configure_environment, register_and_login
+
+
+def book_record(i: int) -> dict:
+    return {
+        "title": f"Benchmark Book {i}",
+        "author": f"Author {i % 500}",
+        "genre": ("Fiction", "History", "Science", "Poetry")[i % 4],
+        "year_published": 1900 + i % 120,
+        "summary": f"Synthetic summary number {i}. " * 4,
+    }
+
+
+async def per_row(client, headers, rows: int, concurrency: int) -> float:
+    queue = iter(range(rows))
+
+    async def worker():
+        for i in queue:
+            await client.post("/books/", json=book_record(i), headers=headers)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def bulk(client, headers, rows: int, batch_size: int, copy: bool) -> float:
+    async def body():
+        for start in range(0, rows, 1000):
+            yield "".join(json.dumps(book_record(i)) + "\n" for i in range(start, min(rows, start + 1000))).encode()
+
+    start = time.perf_counter()
+    response = await client.post(
+        f"/books/import?batch_size={batch_size}&copy={'true' if copy else 'false'}",
+        content=body(), headers={**headers, "content-type": "application/x-ndjson"},
+    )
+    elapsed = time.perf_counter() - start
+    report = response.json()
+    assert report["inserted"] == rows, report
+    return elapsed
+
+
+async def run(args):
+    async with app_client() as client:
+        _, headers = await register_and_login(client)
+        per_row_rows = min(args.rows, args.per_row_rows)
+        per_row_elapsed = await per_row(client, headers, per_row_rows, args.concurrency)
+        bulk_elapsed = await bulk(client, headers, args.rows, args.batch_size, args.copy)
+
+    per_row_rate = per_row_rows / per_row_elapsed
+    bulk_rate = args.rows / bulk_elapsed
+    print(f"POST /books/ x{per_row_rows} ({args.concurrency} clients): {per_row_rate:10.1f} rows/s")
+    print(f"POST /books/import x{args.rows} (batch {args.batch_size}{', COPY' if args.copy else ''}): {bulk_rate:10.1f} rows/s")
+    print(f"speedup: {bulk_rate / per_row_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=20000, help="rows loaded through the bulk endpoint")
+    parser.add_argument("--per-row-rows", type=int, default=1000, help="rows loaded one request at a time")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent per-row clients")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--copy", action="store_true", help="use COPY (PostgreSQL only)")
+    args = parser.parse_args()
+    configure_environment(args)
+    asyncio.run(run(args))
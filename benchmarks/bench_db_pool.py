@@ -0,0 +1,74 @@
+"""
+Throughput of read endpoints with the previous engine settings versus the tuned ones.
+
+Each profile runs in its own subprocess because the engine is created at import time:
+- legacy: echo=True and SQLAlchemy's default pool (5 + 10 overflow, no pre-ping)
+- tuned:  the DB_* settings from the environment (echo off, larger pool, statement cache)
+
+    python benchmarks/bench_db_pool.py --database-url postgresql+asyncpg://... --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import app_client, base_parser, configure_environment, register_and_login, summarize, format_summary, timed_request
+
+PROFILES = {
+    "legacy": {"DB_ECHO": "true", "DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10", "DB_POOL_PRE_PING": "false", "DB_STATEMENT_CACHE_SIZE": "100"},
+    "tuned": {},
+}
+
+
+async def measure(args) -> dict:
+    from app.db import engine, pool_stats
+
+    async with app_client() as client:
+        _, headers = await register_and_login(client)
+        for i in range(50):
+            book = {"title": f"Book {i}", "author": "Author", "genre": "Fiction", "year_published": 2000, "summary": "Summary " * 50}
+            await client.post("/books/", json=book, headers=headers)
+
+        samples = []
+        paths = ["/books/?limit=50", "/books/1", "/books/1/summary", "/books/1/reviews"]
+
+        async def worker(n: int):
+            for i in range(args.requests):
+                await timed_request(client, "GET", paths[(n + i) % len(paths)], samples, headers=headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        return {"throughput": len(samples) / elapsed, "latency": summarize(samples), "pool": pool_stats(engine)}
+
+
+def run_profile(name: str, args) -> dict:
+    env = {**os.environ, **PROFILES[name]}
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    command = [sys.executable, __file__, "--worker", "--requests", str(args.requests), "--concurrency", str(args.concurrency)]
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=50, help="requests per client")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    configure_environment(args)
+    if args.worker:
+        # Keep SQL echo from mixing with the JSON result on stdout
+        sys.stdout = sys.stderr
+        result = asyncio.run(measure(args))
+        sys.stdout = sys.__stdout__
+        print(json.dumps(result))
+    else:
+        for name in PROFILES:
+            result = run_profile(name, args)
+            print(f"{name:<7} {result['throughput']:9.1f} req/s  pool wait max {result['pool'].get('wait_seconds_max', 0) * 1000:.1f}ms")
+            print(format_summary(f"  {name} latency", result["latency"]))
@@ -0,0 +1,73 @@
+"""
+Concurrent /generate-summary uploads against the in-process fake LLM backend.
+
+Submits --uploads PDFs at once, polls until every job finishes and samples
+GET /books/ latency meanwhile, so it shows that summary jobs no longer hold
+the event loop. The fake backend takes --llm-latency seconds per call.
+
+    python benchmarks/bench_generate_summary.py --database-url sqlite+aiosqlite:///./bench.db --pdf Books/rider5.pdf
+"""
+import asyncio
+import time
+
+from common import app_client, base_parser, configure_environment, format_summary, register_and_login, summarize, timed_request
+
+
+def install_fake_llm(latency: float):
+    from app.utils.llm import FakeBackend, LLMClient, set_llm_client
+
+    set_llm_client(LLMClient(FakeBackend(latency)))
+
+
+async def upload_and_wait(client, headers, pdf_bytes: bytes, submit_samples: list, job_samples: list):
+    start = time.perf_counter()
+    response = await timed_request(
+        client, "POST", "/generate-summary", submit_samples,
+        files={"file": ("book.pdf", pdf_bytes, "application/pdf")}, headers=headers,
+    )
+    job_id = response.json()["job_id"]
+    while True:
+        status = (await client.get(f"/generate-summary/{job_id}", headers=headers)).json()["status"]
+        if status in ("done", "failed"):
+            break
+        await asyncio.sleep(0.05)
+    job_samples.append((time.perf_counter() - start) * 1000)
+    return status
+
+
+async def books_probe(client, headers, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        await timed_request(client, "GET", "/books/?limit=20", samples, headers=headers)
+        await asyncio.sleep(0.01)
+
+
+async def run(args):
+    install_fake_llm(args.llm_latency)
+    with open(args.pdf, "rb") as pdf:
+        pdf_bytes = pdf.read()
+
+    async with app_client() as client:
+        _, headers = await register_and_login(client)
+        submit, jobs, books = [], [], []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(books_probe(client, headers, stop, books))
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(upload_and_wait(client, headers, pdf_bytes, submit, jobs) for _ in range(args.uploads)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    print(f"{args.uploads} uploads finished in {elapsed:.2f}s ({statuses.count('done')} done, {statuses.count('failed')} failed)")
+    print(format_summary("POST /generate-summary (job id)", summarize(submit)))
+    print(format_summary("upload -> job finished", summarize(jobs)))
+    print(format_summary("GET /books/ during jobs", summarize(books)))
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--pdf", default="Books/rider5.pdf", help="PDF to upload")
+    parser.add_argument("--uploads", type=int, default=8, help="concurrent uploads")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds each fake LLM call takes")
+    args = parser.parse_args()
+    configure_environment(args)
+    asyncio.run(run(args))
@@ -0,0 +1,66 @@
+"""
+p99 latency of GET /books/ while /login is under load.
+
+Runs the same /books/ workload twice: once on its own and once next to a burst of
+concurrent logins. With bcrypt on the password pool the two p99s should stay close;
+`--inline` runs bcrypt on the event loop (the old behaviour) for comparison.
+
+    python benchmarks/bench_login_contention.py --database-url sqlite+aiosqlite:///./bench.db
+"""
+import asyncio
+
+from common import app_client, base_parser, configure_environment, format_summary, register_and_login, summarize, timed_request
+
+
+async def books_workload(client, headers, requests: int, samples: list):
+    for _ in range(requests):
+        await timed_request(client, "GET", "/books/?limit=20", samples, headers=headers)
+
+
+async def login_workload(client, credentials, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        await timed_request(client, "POST", "/login", samples, json=credentials)
+
+
+async def run(args):
+    from app.utils import password
+
+    if args.inline:
+        # Reproduce the blocking behaviour: bcrypt runs directly on the event loop
+        async def inline(func, *func_args):
+            return func(*func_args)
+        password.password_hasher._run = inline
+
+    async with app_client() as client:
+        credentials, headers = await register_and_login(client)
+        for i in range(20):
+            book = {"title": f"Book {i}", "author": "Author", "genre": "Fiction", "year_published": 2000}
+            await client.post("/books/", json=book, headers=headers)
+
+        idle = []
+        await asyncio.gather(*(books_workload(client, headers, args.requests, idle) for _ in range(args.readers)))
+
+        loaded, logins = [], []
+        stop = asyncio.Event()
+        login_tasks = [asyncio.create_task(login_workload(client, credentials, stop, logins)) for _ in range(args.logins)]
+        await asyncio.gather(*(books_workload(client, headers, args.requests, loaded) for _ in range(args.readers)))
+        stop.set()
+        await asyncio.gather(*login_tasks)
+
+    mode = "inline bcrypt" if args.inline else f"{password.password_hasher.kind} pool x{password.password_hasher.workers}"
+    print(f"password hashing: {mode}")
+    print(format_summary("GET /books/ (idle)", summarize(idle)))
+    print(format_summary("GET /books/ (login burst)", summarize(loaded)))
+    print(format_summary("POST /login", summarize(logins)))
+    print(f"password pool: {password.password_hasher.stats()}")
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--readers", type=int, default=4, help="concurrent /books/ clients")
+    parser.add_argument("--requests", type=int, default=100, help="requests per /books/ client")
+    parser.add_argument("--logins", type=int, default=8, help="concurrent /login clients")
+    parser.add_argument("--inline", action="store_true", help="run bcrypt on the event loop for comparison")
+    args = parser.parse_args()
+    configure_environment(args)
+    asyncio.run(run(args))
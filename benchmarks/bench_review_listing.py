@@ -0,0 +1,125 @@
+"""
+Query plans and latency of the per-book review listing before and after the review indexes.
+
+Seeds a scratch database (its tables are dropped and recreated) with synthetic reviews,
+then for the legacy unbounded query and the new keyset page:
+- prints the plan (EXPLAIN ANALYZE on Postgres, EXPLAIN QUERY PLAN on SQLite)
+- times --samples queries for random books
+first without and then with the (book_id, id) and (user_id) indexes.
+
+    python benchmarks/bench_review_listing.py --database-url postgresql+asyncpg://.../bench --reviews 1000000
+"""
+import asyncio
+import random
+import time
+
+from common import base_parser, configure_environment, summarize, format_summary
+
+REVIEW_INDEXES = ("ix_reviews_book_id_id", "ix_reviews_user_id")
+
+
+def queries(book_id: int) -> dict:
+    from sqlalchemy.future import select
+    from app.models import Review
+
+    return {
+        "legacy (all reviews)": select(Review).filter(Review.book_id == book_id),
+        "keyset page (50, recent)": select(Review).filter(Review.book_id == book_id).order_by(Review.id.desc()).limit(51),
+    }
+
+
+async def seed(engine, args) -> None:
+    from app.db import Base
+    from app.models import Book, Review, User
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(User.__table__.insert(), [{"email": f"reviewer{i}@example.com", "hashed_password": "x"} for i in range(args.users)])
+        await conn.execute(Book.__table__.insert(), [
+            {"title": f"Book {i}", "author": f"Author {i % 100}", "genre": "Fiction", "year_published": 2000} for i in range(args.books)
+        ])
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for offset in range(0, args.reviews, args.chunk_size):
+        rows = [
+            {
+                "book_id": rng.randint(1, args.books),
+                "user_id": rng.randint(1, args.users),
+                "review_text": "Synthetic review text",
+                "rating": float(rng.randint(1, 5)),
+            }
+            for _ in range(min(args.chunk_size, args.reviews - offset))
+        ]
+        async with engine.begin() as conn:
+            await conn.execute(Review.__table__.insert(), rows)
+    print(f"seeded {args.reviews} reviews over {args.books} books in {time.perf_counter() - start:.1f}s")
+
+
+async def set_indexes(engine, present: bool) -> None:
+    from sqlalchemy import text
+    from app.models import Review
+
+    async with engine.begin() as conn:
+        for index in Review.__table__.indexes:
+            if index.name in REVIEW_INDEXES:
+                await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+                if present:
+                    await conn.run_sync(index.create)
+        await conn.execute(text("ANALYZE"))
+
+
+async def explain(engine, query) -> str:
+    from sqlalchemy import text
+
+    async with engine.connect() as conn:
+        sql = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN (ANALYZE, BUFFERS) "
+        rows = (await conn.execute(text(prefix + sql))).all()
+    return "\n".join("    " + " | ".join(str(column) for column in row) for row in rows)
+
+
+async def measure(engine, args, label: str) -> None:
+    rng = random.Random(args.seed)
+    print(f"\n== {label} ==")
+    for name, query in queries(1).items():
+        print(f"  {name}:\n{await explain(engine, query)}")
+
+    samples = {name: [] for name in queries(1)}
+    async with engine.connect() as conn:
+        for _ in range(args.samples):
+            for name, query in queries(rng.randint(1, args.books)).items():
+                start = time.perf_counter()
+                (await conn.execute(query)).all()
+                samples[name].append((time.perf_counter() - start) * 1000)
+    for name, values in samples.items():
+        print(format_summary(name, summarize(values)))
+
+
+async def run(args):
+    from app.db import engine
+
+    await seed(engine, args)
+    await set_indexes(engine, present=False)
+    await measure(engine, args, "without review indexes")
+    await set_indexes(engine, present=True)
+    await measure(engine, args, "with (book_id, id) and (user_id) indexes")
+    await engine.dispose()
+
+
+def main():
+    parser = base_parser(__doc__, drops_tables=True)
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="reviews inserted per transaction while seeding")
+    parser.add_argument("--samples", type=int, default=200, help="timed queries per variant")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    configure_environment(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Latency of GET /books/search over a synthetic catalog, compared with downloading the whole
+book list (what clients did to filter on their side before search existed).
+
+Seeds a scratch database (its tables are dropped and recreated) with --books books whose
+titles and summaries draw from a fixed vocabulary, then issues one- and two-word queries.
+On Postgres this measures the tsvector/GIN path; elsewhere the in-memory inverted index
+(its one-off build is reported separately).
+
+    python benchmarks/bench_search.py --database-url postgresql+asyncpg://.../bench --books 100000
+"""
+import asyncio
+import random
+import time
+
+from common import app_client, base_parser, configure_environment, register_and_login, summarize, format_summary, timed_request
+
+WORDS = (
+    "dragon wizard castle galaxy empire ocean river mountain forest shadow crown queen detective murder "
+    "garden winter summer letters journey island war peace machine robot secret poison storm harbor "
+    "village kingdom star desert frontier memory silence glass iron silver golden midnight orchard"
+).split()
+GENRES = ("Fantasy", "Science Fiction", "Mystery", "History", "Romance", "Poetry", "Biography", "Thriller")
+
+
+def book_row(rng: random.Random, i: int) -> dict:
+    return {
+        "title": " ".join(rng.sample(WORDS, 3)).title(),
+        "author": f"Author {i % 5000}",
+        "genre": rng.choice(GENRES),
+        "year_published": rng.randint(1850, 2024),
+        "summary": " ".join(rng.choice(WORDS) for _ in range(40)),
+    }
+
+
+async def seed(args) -> None:
+    from app.db import Base, engine
+    from app.models import Book
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for offset in range(0, args.books, 5000):
+        async with engine.begin() as conn:
+            await conn.execute(Book.__table__.insert(), [book_row(rng, i) for i in range(offset, min(args.books, offset + 5000))])
+    print(f"seeded {args.books} books in {time.perf_counter() - start:.1f}s")
+
+
+async def run(args):
+    await seed(args)
+    rng = random.Random(args.seed + 1)
+    queries = [" ".join(rng.sample(WORDS, rng.choice((1, 2)))) for _ in range(args.queries)]
+
+    async with app_client() as client:
+        _, headers = await register_and_login(client)
+
+        start = time.perf_counter()
+        await client.get("/books/search", params={"q": "warmup"}, headers=headers)
+        print(f"first search (index build on non-Postgres databases): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        samples = []
+        for q in queries:
+            response = await timed_request(client, "GET", "/books/search", samples, params={"q": q, "limit": args.limit, "include_summary": "false"}, headers=headers)
+            assert response.status_code == 200, response.text
+        print(format_summary(f"GET /books/search (limit={args.limit})", summarize(samples)))
+
+        full_list = []
+        for _ in range(args.full_list_runs):
+            start = time.perf_counter()
+            cursor, payload = None, 0
+            while True:
+                params = {"limit": 1000, **({"after": cursor} if cursor else {})}
+                response = await client.get("/books/", params=params, headers=headers)
+                payload += len(response.content)
+                cursor = response.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+            full_list.append((time.perf_counter() - start) * 1000)
+        print(format_summary("full catalog download", summarize(full_list)) + f" ({payload / 1e6:.1f}MB)")
+
+
+def main():
+    parser = base_parser(__doc__, drops_tables=True)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--full-list-runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    configure_environment(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
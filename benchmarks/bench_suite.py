@@ -0,0 +1,238 @@
+"""
+Load test of the main endpoints against a deterministically seeded catalog, with a regression check.
+
+Seeds a scratch database (its tables are dropped and recreated) with --users users, --books books
+and --reviews reviews from a seeded generator, replaces Ollama with the in-process fake LLM
+backend (each call takes --llm-latency seconds; embeddings use the local hashing backend),
+then drives each endpoint in turn with --concurrency clients for --requests requests (after
+--warmup untimed ones) through the in-process ASGI transport.
+
+Throughput and p50/p95/p99 latency per endpoint are written to --output as JSON. With a
+--baseline file, an endpoint regresses when its p95 grows or its throughput drops by more
+than --threshold (a fraction), or when it answers more errors than in the baseline; the exit
+status is 1 if any endpoint regressed. A baseline recorded with different workload settings
+(database backend, sizes, seed, concurrency, ...) is not compared against; the exit status is 2.
+
+    python benchmarks/bench_suite.py --database-url sqlite+aiosqlite:///./bench.db --output results.json \\
+        --baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --database-url sqlite+aiosqlite:///./bench.db --output benchmarks/baseline.json
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+
+from common import app_client, base_parser, configure_environment, summarize
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Settings that must match between a run and its baseline for the numbers to be comparable
+WORKLOAD_KEYS = ("users", "books", "reviews", "seed", "concurrency", "requests", "login_requests", "warmup", "llm_latency")
+PASSWORD = "benchmark-password"
+GENRES = ("Fantasy", "Science Fiction", "Mystery", "History", "Romance", "Poetry", "Biography", "Thriller")
+WORDS = (
+    "dragon wizard castle galaxy empire ocean river mountain forest shadow crown queen detective murder "
+    "garden winter summer letters journey island war peace machine robot secret poison storm harbor"
+).split()
+
+
+def install_fake_llm(latency: float):
+    from app.utils.llm import FakeBackend, LLMClient, set_llm_client
+
+    def reply(messages) -> str:
+        # Deterministic answer: recommendation prompts get their first candidate book back
+        candidate = re.search(r"book id (\d+): summary", messages[-1]["content"])
+        return json.dumps({"book_id": int(candidate.group(1))}) if candidate else "Stub summary."
+
+    set_llm_client(LLMClient(FakeBackend(latency, reply)))
+
+
+async def seed(args) -> None:
+    """Deterministic users, books and reviews (same --seed, same data)."""
+    from app.db import Base, engine
+    from app.models import Book, Review, User
+    from app.utils.password import secure_pwd
+
+    rng = random.Random(args.seed)
+    hashed_password = secure_pwd(PASSWORD)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(User.__table__.insert(), [
+            {"email": f"bench-user-{i}@example.com", "hashed_password": hashed_password} for i in range(args.users)
+        ])
+        await conn.execute(Book.__table__.insert(), [
+            {
+                "title": " ".join(rng.sample(WORDS, 3)).title(),
+                "author": f"Author {rng.randrange(max(1, args.books // 10))}",
+                "genre": rng.choice(GENRES),
+                "year_published": rng.randint(1850, 2024),
+                "summary": " ".join(rng.choice(WORDS) for _ in range(60)),
+            }
+            for _ in range(args.books)
+        ])
+        reviews = [(rng.randint(1, args.books), rng.randint(1, args.users), float(rng.randint(1, 5))) for _ in range(args.reviews)]
+        await conn.execute(Review.__table__.insert(), [
+            {"book_id": book_id, "user_id": user_id, "review_text": "Synthetic review " + " ".join(rng.sample(WORDS, 5)), "rating": rating}
+            for book_id, user_id, rating in reviews
+        ])
+        # Bring the rating rollup in line with the seeded reviews
+        rollup = {}
+        for book_id, _, rating in reviews:
+            rating_sum, rating_count = rollup.get(book_id, (0.0, 0))
+            rollup[book_id] = (rating_sum + rating, rating_count + 1)
+        for book_id, (rating_sum, rating_count) in rollup.items():
+            await conn.execute(
+                Book.__table__.update().where(Book.id == book_id).values(rating_sum=rating_sum, rating_count=rating_count)
+            )
+
+
+def endpoints(args) -> dict:
+    """name -> function(rng, user) returning (method, url, request kwargs)."""
+    book = lambda rng: rng.randint(1, args.books)
+    return {
+        "GET /books/": lambda rng, user: ("GET", "/books/", {"params": {"limit": 50, "after": rng.randrange(args.books)}}),
+        "GET /books/ (filtered)": lambda rng, user: ("GET", "/books/", {"params": {"genre": rng.choice(GENRES), "limit": 50}}),
+        "GET /books/{id}": lambda rng, user: ("GET", f"/books/{book(rng)}", {}),
+        "GET /books/{id}/summary": lambda rng, user: ("GET", f"/books/{book(rng)}/summary", {}),
+        "GET /books/{id}/reviews": lambda rng, user: ("GET", f"/books/{book(rng)}/reviews", {}),
+        "GET /books/search": lambda rng, user: ("GET", "/books/search", {"params": {"q": " ".join(rng.sample(WORDS, 2))}}),
+        "GET /books/facets": lambda rng, user: ("GET", "/books/facets", {}),
+        "POST /books/reviews": lambda rng, user: (
+            "POST", "/books/reviews", {"json": {"book_id": book(rng), "review_text": "Benchmark review", "rating": rng.randint(1, 5)}},
+        ),
+        "GET /recommendations": lambda rng, user: ("GET", "/recommendations", {}),
+        "POST /login": lambda rng, user: ("POST", "/login", {"json": {"email": user["email"], "password": PASSWORD}}),
+    }
+
+
+async def drive(client, users: list, name: str, make_request, requests: int, args) -> dict:
+    rng = random.Random(f"{args.seed}:{name}")
+    plan = [(make_request(rng, users[i % len(users)]), users[i % len(users)]) for i in range(args.warmup + requests)]
+    # Untimed warm-up requests absorb one-off work (index builds, cold caches)
+    for (method, url, kwargs), user in plan[:args.warmup]:
+        await client.request(method, url, headers=user["headers"], **kwargs)
+    samples, errors = [], 0
+    queue = iter(plan[args.warmup:])
+
+    async def worker():
+        nonlocal errors
+        for (method, url, kwargs), user in queue:
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=user["headers"], **kwargs)
+            samples.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"throughput": len(samples) / elapsed, "errors": errors, **summarize(samples)}
+
+
+async def run(args) -> dict:
+    install_fake_llm(args.llm_latency)
+    await seed(args)
+    results = {}
+    async with app_client() as client:
+        users = []
+        for i in range(args.users):
+            email = f"bench-user-{i}@example.com"
+            response = await client.post("/login", json={"email": email, "password": PASSWORD})
+            users.append({"email": email, "headers": {"Authorization": f"Bearer {response.json()['access_token']}"}})
+        selected = endpoints(args)
+        if args.only:
+            selected = {name: make_request for name, make_request in selected.items() if name in args.only}
+        for name, make_request in selected.items():
+            # Each login pays a full bcrypt verification, so it gets its own (smaller) request count
+            requests = args.login_requests if name == "POST /login" else args.requests
+            results[name] = await drive(client, users, name, make_request, requests, args)
+            print(f"{name:<28} {results[name]['throughput']:9.1f} req/s  p50={results[name]['p50']:8.2f}ms "
+                  f"p95={results[name]['p95']:8.2f}ms p99={results[name]['p99']:8.2f}ms errors={results[name]['errors']}")
+    return results
+
+
+def meta_mismatches(meta: dict, baseline: dict) -> list:
+    """Workload settings (and the database backend) that differ between `meta` and the baseline's."""
+    previous = baseline.get("meta", {})
+    return [
+        f"{key}: baseline {previous.get(key)!r}, now {meta[key]!r}"
+        for key in ("database", *WORKLOAD_KEYS)
+        if previous.get(key) != meta[key]
+    ]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Names of endpoints whose p95 grew, or whose throughput fell, by more than `threshold`,
+    or that answered more errors than in the baseline.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        slower = current["p95"] > previous["p95"] * (1 + threshold)
+        fewer = current["throughput"] < previous["throughput"] * (1 - threshold)
+        failing = current["errors"] > previous.get("errors", 0)
+        status = "REGRESSION" if slower or fewer or failing else "ok"
+        print(f"{name:<28} p95 {previous['p95']:8.2f} -> {current['p95']:8.2f}ms  "
+              f"throughput {previous['throughput']:9.1f} -> {current['throughput']:9.1f} req/s  "
+              f"errors {previous.get('errors', 0)} -> {current['errors']}  {status}")
+        if slower or fewer or failing:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = base_parser(__doc__, drops_tables=True)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint")
+    parser.add_argument("--login-requests", type=int, default=40)
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per endpoint before measuring")
+    parser.add_argument("--llm-latency", type=float, default=0.01, help="seconds each fake LLM call takes")
+    parser.add_argument("--only", nargs="*", help="endpoint names to run (default: all)")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", default=None, help=f"results file to compare against (e.g. {DEFAULT_BASELINE})")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression, e.g. 0.25 = 25%%")
+    args = parser.parse_args()
+    configure_environment(args)
+    os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "database": os.environ.get("DATABASE_URL", "").split("://")[0],
+        **{key: getattr(args, key) for key in WORKLOAD_KEYS},
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Checked before running so a mismatched baseline fails fast
+        mismatches = meta_mismatches(meta, baseline)
+        if mismatches:
+            print(f"not comparable with {args.baseline}: " + "; ".join(mismatches))
+            sys.exit(2)
+
+    results = asyncio.run(run(args))
+    report = {"meta": meta, "endpoints": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} endpoint(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Shared helpers for the in-process benchmarks in this directory.
+
+Benchmarks drive the FastAPI app through httpx's ASGI transport, so no server
+has to be started. Point them at a scratch database with --database-url, e.g.
+`--database-url sqlite+aiosqlite:///./bench.db`; it defaults to DATABASE_URL, except for
+benchmarks that drop tables, which require it.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+def base_parser(description: str, drops_tables: bool = False) -> argparse.ArgumentParser:
+    """
+    Parser with the shared options. Benchmarks that drop tables pass `drops_tables=True`, so
+    the database must be named explicitly instead of falling back to the app's DATABASE_URL.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    if drops_tables:
+        parser.add_argument("--database-url", required=True, help="scratch database to run against; its tables are dropped")
+    else:
+        parser.add_argument("--database-url", default=None, help="database to run against (defaults to DATABASE_URL)")
+    return parser
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Apply command line settings before the app (and its engine) is imported."""
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+
+@asynccontextmanager
+async def app_client():
+    """Run the app's lifespan and yield an httpx client bound to it in-process."""
+    import httpx
+    from main import app, lifespan
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            yield client
+
+
+async def register_and_login(client, password: str = "benchmark-password") -> tuple:
+    """Create a throwaway user; returns (credentials payload, auth headers)."""
+    payload = {"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": password}
+    await client.post("/register", json=payload)
+    response = await client.post("/login", json=payload)
+    token = response.json()["access_token"]
+    return payload, {"Authorization": f"Bearer {token}"}
+
+
+async def timed_request(client, method: str, url: str, samples: list, **kwargs):
+    """Send one request and append its latency in milliseconds to `samples`."""
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    samples.append((time.perf_counter() - start) * 1000)
+    return response
+
+
+def percentile(samples: list, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list) -> dict:
+    """Latency summary in milliseconds."""
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples) if samples else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def format_summary(label: str, summary: dict) -> str:
+    return (
+        f"{label:<32} n={summary['count']:<6} mean={summary['mean']:8.2f}ms "
+        f"p50={summary['p50']:8.2f}ms p95={summary['p95']:8.2f}ms p99={summary['p99']:8.2f}ms"
+    )
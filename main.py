@@ -1,11 +1,27 @@
+import asyncio
+import logging
+import os
 from fastapi import FastAPI
 from app.routes.auth import router as auth_router
 from app.routes.books import router as books_router
 from app.routes.reviews import router as reviews_router
+from app.routes.metrics import router as metrics_router
 from sqlalchemy.ext.asyncio import AsyncEngine
-from app.db import engine, Base
+from app.db import ReadYourWritesMiddleware, engine, replica_engine, Base
+from app.utils.embeddings import book_index
+from app.utils.auth import AUTH_MODE, TOKEN_SWEEP_INTERVAL_SECONDS, run_token_sweeper
+from app.utils.llm import close_llm_client, get_llm_client
+from app.utils.password import password_hasher
+from app.utils.summary_jobs import shutdown_pdf_pool
+from app.utils.telemetry import TimingMiddleware, instrument_engine
 from contextlib import asynccontextmanager
 
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# Attribute statement execution time to the requests that issue it
+instrument_engine(engine)
+instrument_engine(replica_engine)
+
 # Create the database tables with lifespan events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -14,16 +30,37 @@ async def lifespan(app: FastAPI):
         async with engine.begin() as conn:
             # Create database tables
             await conn.run_sync(Base.metadata.create_all)
+    # Purge expired rows from the tokens table in the background (stateful auth only)
+    sweeper = None
+    if AUTH_MODE == "stateful" and TOKEN_SWEEP_INTERVAL_SECONDS > 0:
+        sweeper = asyncio.create_task(run_token_sweeper())
+    # One LLM client (pooled connections, global concurrency limit) for the app's lifetime
+    get_llm_client()
+    # Load the persisted recommendation index and sync it with the catalog without delaying startup
+    index_warm_up = asyncio.create_task(book_index.warm_up())
     yield
-    # Add any cleanup logic here if necessary
+    if sweeper is not None:
+        sweeper.cancel()
+    index_warm_up.cancel()
+    await close_llm_client()
+    # Release the password hashing and PDF extraction workers
+    password_hasher.shutdown()
+    shutdown_pdf_pool()
 
 # Create the FastAPI app with the lifespan context
 app = FastAPI(lifespan=lifespan)
 
+# Per-route latency and db/auth/llm/pdf time, exposed on /metrics
+app.add_middleware(TimingMiddleware)
+
+# Remember the client's last write in a cookie so reads on any worker avoid a lagging replica
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Include the authentication routes
 app.include_router(auth_router)
 app.include_router(books_router)
 app.include_router(reviews_router)
+app.include_router(metrics_router)
 
 # Main entry point to run the app
 if __name__ == "__main__":
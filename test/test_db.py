@@ -0,0 +1,61 @@
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+import app.db as db
+from app.models import Book
+
+
+def fake_request(user_id=None, cookies=None):
+    return SimpleNamespace(state=SimpleNamespace(user_id=user_id), cookies=cookies or {})
+
+
+async def first_title(session_gen):
+    session = await session_gen.__anext__()
+    title = (await session.execute(select(Book.title))).scalar()
+    await session_gen.aclose()
+    return title
+
+
+# Test that reads go to the replica, except for a user who just wrote to the primary
+@pytest.mark.asyncio
+async def test_read_your_writes_routing(tmp_path, monkeypatch):
+    primary = db.create_engine(f"sqlite+aiosqlite:///{tmp_path}/primary.db")
+    replica = db.create_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    for engine in (primary, replica):
+        async with engine.begin() as conn:
+            await conn.run_sync(db.Base.metadata.create_all)
+    async with replica.begin() as conn:
+        await conn.execute(Book.__table__.insert().values(title="Stale", author="A", genre="G", year_published=2000))
+
+    monkeypatch.setattr(db, "engine", primary)
+    monkeypatch.setattr(db, "replica_engine", replica)
+    monkeypatch.setattr(db, "AsyncSessionLocal", sessionmaker(bind=primary, class_=AsyncSession, sync_session_class=db.PrimarySession))
+    monkeypatch.setattr(db, "ReadSessionLocal", sessionmaker(bind=replica, class_=AsyncSession))
+    db.recent_writers.clear()
+
+    assert await first_title(db.get_read_db(fake_request(7))) == "Stale"
+
+    writes = db.get_db(fake_request(7))
+    session = await writes.__anext__()
+    session.add(Book(title="Fresh", author="A", genre="G", year_published=2024))
+    await session.commit()
+    await writes.aclose()
+
+    assert await first_title(db.get_read_db(fake_request(7))) == "Fresh"
+    assert await first_title(db.get_read_db(fake_request(8))) == "Stale"
+    assert await first_title(db.get_read_db(fake_request())) == "Stale"
+
+    db.recent_writers.clear()
+    assert await first_title(db.get_read_db(fake_request(7))) == "Stale"
+
+    # On another worker only the client's last-write cookie knows about the write
+    cookies = {db.LAST_WRITE_COOKIE: str(session.info["request"].state.last_write)}
+    assert await first_title(db.get_read_db(fake_request(7, cookies))) == "Fresh"
+    expired = {db.LAST_WRITE_COOKIE: str(time.time() - db.READ_YOUR_WRITES_SECONDS - 1)}
+    assert await first_title(db.get_read_db(fake_request(7, expired))) == "Stale"
+    assert await first_title(db.get_read_db(fake_request(7, {db.LAST_WRITE_COOKIE: "garbage"}))) == "Stale"
+    await primary.dispose()
+    await replica.dispose()
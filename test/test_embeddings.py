@@ -0,0 +1,185 @@
+import asyncio
+import numpy as np
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+import app.db as db
+from app.models import Book
+from app.utils.catalog import bump_stored_catalog_revision, stored_catalog_revision
+from app.utils.embeddings import HashingEmbedder, OllamaEmbedder, VectorIndex
+from app.utils.llm import FakeBackend, LLMClient, set_llm_client
+
+
+# Test that the hashing embedder is deterministic and normalized
+@pytest.mark.asyncio
+async def test_hashing_embedder_deterministic():
+    embedder = HashingEmbedder(dimensions=64)
+    first = await embedder.embed(["magic dragons", "space lasers"])
+    second = await embedder.embed(["magic dragons", "space lasers"])
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+
+
+# Test top-k cosine search and exclusions
+@pytest.mark.asyncio
+async def test_vector_index_search():
+    index = VectorIndex(HashingEmbedder())
+    await index.rebuild([
+        (1, "wizards magic dragons spells"),
+        (2, "spaceships galaxy lasers aliens"),
+        (3, "dragons magic wizard school"),
+    ])
+    query = (await index.embedder.embed(["magic dragons"]))[0]
+    results = index.search(query, k=2)
+    assert [book_id for book_id, _ in results] in ([1, 3], [3, 1])
+    assert [book_id for book_id, _ in index.search(query, k=1, exclude=[1, 3])] == [2]
+
+
+# Test incremental upsert and removal keep the matrix consistent
+@pytest.mark.asyncio
+async def test_vector_index_incremental_updates():
+    index = VectorIndex(HashingEmbedder())
+    await index.rebuild([(1, "alpha"), (2, "beta"), (3, "gamma")])
+    index.remove(1)
+    await index.upsert(4, "delta")
+    await index.upsert(2, "gamma")
+    assert sorted(index.ids) == [2, 3, 4]
+    assert index.matrix.shape[0] == 3
+    assert all(index.ids[row] == book_id for book_id, row in index.positions.items())
+    assert np.allclose(index.matrix[index.positions[2]], index.matrix[index.positions[3]])
+
+
+# Test that the review profile leans towards highly rated books
+@pytest.mark.asyncio
+async def test_profile_prefers_liked_books():
+    index = VectorIndex(HashingEmbedder())
+    await index.rebuild([(1, "magic dragons"), (2, "space lasers"), (3, "magic dragons wizard"), (4, "space lasers aliens")])
+    profile = await index.profile([
+        {"book_id": 1, "review_text": "great", "rating": 5},
+        {"book_id": 2, "review_text": "boring", "rating": 1},
+    ])
+    assert index.search(profile, k=1, exclude=[1, 2])[0][0] == 3
+
+
+# Embedder that yields to the event loop while embedding, like a remote one
+class SlowEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def embed(self, texts):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return await super().embed(texts)
+
+
+@pytest_asyncio.fixture
+async def catalog(tmp_path):
+    engine = db.create_engine(f"sqlite+aiosqlite:///{tmp_path}/catalog.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as session:
+        session.add_all([
+            Book(id=1, title="Dragons", author="A", genre="Fantasy", summary="magic"),
+            Book(id=2, title="Stars", author="B", genre="SF", summary="space"),
+        ])
+        await bump_stored_catalog_revision(session)
+        await session.commit()
+    yield Session
+    await engine.dispose()
+
+
+# Test that concurrent loads sync once and books changed locally mid-sync keep their local state
+@pytest.mark.asyncio
+async def test_vector_index_changes_during_sync(catalog):
+    embedder = SlowEmbedder()
+    index = VectorIndex(embedder)
+    async with catalog() as first, catalog() as second:
+        await index.ensure_loaded(first)
+        first.add(Book(id=3, title="Robots", author="C", genre="SF", summary="machines"))
+        await bump_stored_catalog_revision(first)
+        await first.commit()
+
+        async def change_books_mid_sync():
+            await asyncio.sleep(0.02)
+            await index.upsert(1, "dragons rewritten while the index was syncing")
+            index.remove(2)  # deleted after the sync read its snapshot
+
+        await asyncio.gather(index.ensure_loaded(first), index.ensure_loaded(second), change_books_mid_sync())
+        assert index.revision == await stored_catalog_revision(first)
+    assert sorted(index.ids) == [1, 3]
+    assert embedder.calls == 3
+    expected = (await HashingEmbedder().embed(["dragons rewritten while the index was syncing"]))[0]
+    assert np.allclose(index.matrix[index.positions[1]], expected)
+
+
+# Test that an upsert whose embedding finishes after the book was removed is dropped
+@pytest.mark.asyncio
+async def test_vector_index_remove_during_upsert():
+    index = VectorIndex(SlowEmbedder())
+    await index.rebuild([(1, "alpha")])
+    upsert = asyncio.create_task(index.upsert(2, "beta"))
+    await asyncio.sleep(0.01)
+    index.remove(2)
+    await upsert
+    assert index.ids == [1]
+
+
+# Test that a stored revision bump (another worker or the CLI import) re-embeds only changed books
+@pytest.mark.asyncio
+async def test_vector_index_syncs_stored_revision(catalog):
+    embedder = SlowEmbedder()
+    index = VectorIndex(embedder)
+    async with catalog() as session:
+        await index.ensure_loaded(session)
+        await index.ensure_loaded(session)
+        assert embedder.calls == 1
+
+        book = await session.get(Book, 1)
+        book.rating_sum, book.version = 5, book.version + 1  # rating-only change: same document
+        session.add(Book(id=4, title="Robots", author="C", genre="SF", summary="machines"))
+        await session.delete(await session.get(Book, 2))
+        await bump_stored_catalog_revision(session)
+        await session.commit()
+
+        await index.ensure_loaded(session)
+    assert sorted(index.ids) == [1, 4]
+    assert embedder.calls == 2
+    assert index.versions[1] == 2
+
+
+# Test that a saved index is reused after a restart and only the changes since are embedded
+@pytest.mark.asyncio
+async def test_vector_index_persists(catalog, tmp_path):
+    path = str(tmp_path / "index.npz")
+    first = VectorIndex(SlowEmbedder(), path)
+    async with catalog() as session:
+        await first.ensure_loaded(session)
+        session.add(Book(id=5, title="Ships", author="D", genre="Sea", summary="sailing"))
+        await bump_stored_catalog_revision(session)
+        await session.commit()
+
+        embedder = SlowEmbedder()
+        restarted = VectorIndex(embedder, path)
+        assert await restarted.load()
+        assert restarted.ids == first.ids and np.allclose(restarted.matrix, first.matrix)
+        await restarted.ensure_loaded(session)
+    assert sorted(restarted.ids) == [1, 2, 5]
+    assert embedder.calls == 1
+    assert not await VectorIndex(HashingEmbedder(), path).load()
+
+
+# Test that Ollama embeddings go through the shared LLM client (its limits and retries apply)
+@pytest.mark.asyncio
+async def test_ollama_embedder_uses_llm_client():
+    backend = FakeBackend()
+    set_llm_client(LLMClient(backend, concurrency=1))
+    try:
+        matrix = await OllamaEmbedder().embed(["dragons and magic", "space travel"])
+    finally:
+        set_llm_client(None)
+    assert matrix.shape == (2, backend.dimensions)
+    assert backend.calls == 1
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
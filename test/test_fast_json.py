@@ -0,0 +1,47 @@
+import json
+import pytest
+from sqlalchemy import create_engine, insert, select
+from app.db import Base
+from app.models import Book
+from app.routes.books import BOOK_FIELDS, BOOK_LIST_ADAPTER, BOOK_LIST_COLUMNS
+from app.utils.fast_json import RowsJSONResponse, rows_to_json
+
+ROWS = 5000
+
+
+@pytest.fixture(scope="module")
+def book_rows():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Book.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(Book), [
+            {"title": f"Book {i}", "author": f"Author {i % 50}", "genre": "Fiction", "year_published": 1900 + i % 120, "summary": f"Summary {i} " * 10}
+            for i in range(ROWS)
+        ])
+        with_summary = conn.execute(select(*BOOK_LIST_COLUMNS, Book.summary).order_by(Book.id)).all()
+        without_summary = conn.execute(select(*BOOK_LIST_COLUMNS).order_by(Book.id)).all()
+    return with_summary, without_summary
+
+
+def pydantic_json(rows) -> bytes:
+    return BOOK_LIST_ADAPTER.dump_json(BOOK_LIST_ADAPTER.validate_python(rows, from_attributes=True))
+
+
+# Test that the fast path renders the same documents as the response model, null summaries included
+def test_rows_to_json_matches_response_model(book_rows):
+    for rows in book_rows:
+        assert json.loads(rows_to_json(rows, BOOK_FIELDS)) == json.loads(pydantic_json(rows))
+    assert rows_to_json([], BOOK_FIELDS) == b"[]"
+    response = RowsJSONResponse(book_rows[1][:2], BOOK_FIELDS, headers={"X-Next-Cursor": "2"})
+    assert response.media_type == "application/json" and response.headers["x-next-cursor"] == "2"
+
+
+# Test that the OpenAPI schema still documents the response models
+def test_openapi_schema_keeps_response_models():
+    from main import app
+
+    schema = app.openapi()
+    books = schema["paths"]["/books/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    reviews = schema["paths"]["/books/{id}/reviews"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert books["items"]["$ref"].endswith("/BookOut")
+    assert reviews["items"]["$ref"].endswith("/ReviewOut")
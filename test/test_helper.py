@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import re
+import httpx
+import ollama
+import pytest
+from app.utils import helper
+from app.utils.helper import extract_text_from_pages, split_text, summarize_text, summarize_text_events
+from app.utils.llm import FakeBackend, LLMClient, OllamaBackend
+from app.utils.summary_cache import DiskCache, cache_key
+
+
+# Fake Ollama server: answers /api/chat after an injected delay and tracks concurrency
+class FakeOllama:
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+            body = json.loads(request.content)
+            content = body["messages"][-1]["content"]
+            summary = f"summary {self.calls} ({len(content)} chars)."
+            if body.get("stream"):
+                return httpx.Response(200, content=self.stream(summary.split(" ")))
+            return httpx.Response(200, json={"model": "fake", "message": {"role": "assistant", "content": summary}, "done": True})
+        finally:
+            self.active -= 1
+
+    async def stream(self, words):
+        # NDJSON parts as Ollama streams them, one word every `latency` seconds
+        self.streams_closed_early = False
+        try:
+            for i, word in enumerate(words):
+                await asyncio.sleep(self.latency)
+                part = {"model": "fake", "message": {"role": "assistant", "content": ("" if i == 0 else " ") + word}, "done": False}
+                yield (json.dumps(part) + "\n").encode()
+            yield (json.dumps({"model": "fake", "message": {"role": "assistant", "content": ""}, "done": True}) + "\n").encode()
+        except BaseException:
+            self.streams_closed_early = True
+            raise
+
+    def client(self, concurrency: int = 4) -> LLMClient:
+        ollama_client = ollama.AsyncClient(host="http://fake-ollama", transport=httpx.MockTransport(self.handler))
+        return LLMClient(OllamaBackend(ollama_client), concurrency=concurrency)
+
+
+# Test that chunks respect the limit and break on sentence boundaries
+def test_split_text_on_boundaries():
+    sentence = "This sentence is exactly forty-four chars. "
+    text = (sentence * 10).strip() + "\n\n" + (sentence * 10).strip()
+    chunks = split_text(text, limit=200)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
+
+
+# Test that oversized sentences are still split within the limit
+def test_split_text_oversized_sentence():
+    chunks = split_text("word " * 500, limit=100)
+    assert all(0 < len(chunk) <= 100 for chunk in chunks)
+
+
+# Test the map-reduce summarizer against the fake server
+@pytest.mark.asyncio
+async def test_summarize_text_map_reduce():
+    fake = FakeOllama(latency=0.05)
+    text = "\n\n".join(f"Paragraph {i}. " + "Some sentence about the plot. " * 20 for i in range(20))
+    async with fake.client() as client:
+        summary = await summarize_text(text, client=client, concurrency=3, limit=1000)
+    assert summary.startswith("summary")
+    assert fake.max_active <= 3
+    assert fake.calls > len(split_text(text, limit=1000))
+
+
+# Test that short text is summarized in a single call
+@pytest.mark.asyncio
+async def test_summarize_short_text_single_call():
+    fake = FakeOllama(latency=0)
+    async with fake.client() as client:
+        await summarize_text("A short text.", client=client)
+    assert fake.calls == 1
+
+
+# Test that only pages without a text layer are rasterized, one page at a time
+def test_extract_text_from_pages_ocr_only_scanned(monkeypatch):
+    class FakePage:
+        def __init__(self, text):
+            self.text = text
+
+        def extract_text(self):
+            return self.text
+
+    class FakeReader:
+        def __init__(self, path):
+            self.pages = [FakePage("Digital page one. " * 5), FakePage(""), FakePage("Digital page three. " * 5)]
+
+    rasterized = []
+
+    def fake_convert_from_path(path, first_page, last_page):
+        rasterized.append((first_page, last_page))
+        return [f"image of page {first_page}"]
+
+    monkeypatch.setattr(helper, "PdfReader", FakeReader)
+    monkeypatch.setattr(helper, "convert_from_path", fake_convert_from_path)
+    monkeypatch.setattr(helper.pytesseract, "image_to_string", lambda image: f"OCR text from {image}")
+
+    texts = extract_text_from_pages("book.pdf", 1, 3)
+    assert rasterized == [(2, 2)]
+    assert texts[0].startswith("Digital page one.")
+    assert texts[1] == "OCR text from image of page 2"
+    assert texts[2].startswith("Digital page three.")
+
+
+# Test that the disk cache evicts the least recently used entries
+def test_disk_cache_lru_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=300)
+    cache.set(cache_key("a"), "a" * 100)
+    cache.set(cache_key("b"), "b" * 100)
+    os.utime(cache._path(cache_key("a")), (0, 0))
+    os.utime(cache._path(cache_key("b")), (1, 1))
+    assert cache.get(cache_key("a")) == "a" * 100  # refreshes "a"
+    cache.set(cache_key("c"), "c" * 150)
+    assert cache.get(cache_key("b")) is None
+    assert cache.get(cache_key("a")) == "a" * 100
+    assert cache.get(cache_key("c")) == "c" * 150
+    assert cache.stats()["evictions"] == 1
+
+
+# Test that cached chunk summaries are reused on a second run
+@pytest.mark.asyncio
+async def test_summarize_text_reuses_cache(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10 * 1024 * 1024)
+    text = "\n\n".join(f"Paragraph {i}. " + "Some sentence about the plot. " * 20 for i in range(10))
+    fake = FakeOllama(latency=0)
+    async with fake.client() as client:
+        first = await summarize_text(text, client=client, limit=1000, cache=cache)
+        calls = fake.calls
+        second = await summarize_text(text, client=client, limit=1000, cache=cache)
+    assert first == second
+    assert fake.calls == calls
+
+
+# Test that the streaming summarizer emits every chunk, then the final summary piece by piece
+@pytest.mark.asyncio
+async def test_summarize_text_events():
+    fake = FakeOllama(latency=0.01)
+    text = "\n\n".join(f"Paragraph {i}. " + "Some sentence about the plot. " * 20 for i in range(5))
+    async with fake.client() as client:
+        events = [event async for event in summarize_text_events(text, client=client, limit=1000)]
+    kinds = [kind for kind, _ in events]
+    chunks = [data for kind, data in events if kind == "chunk" and data["round"] == 1]
+    assert sorted(chunk["index"] for chunk in chunks) == list(range(len(split_text(text, limit=1000))))
+    assert kinds.index("delta") > kinds.index("chunk")
+    assert kinds[-1] == "final"
+    deltas = "".join(data["content"] for kind, data in events if kind == "delta")
+    assert deltas == events[-1][1]["summary"] and deltas.startswith("summary")
+
+
+# Test that cancelling the stream (client disconnect) cancels the model call in flight
+@pytest.mark.asyncio
+async def test_summarize_text_events_cancel():
+    fake = FakeOllama(latency=0.2)
+
+    async def consume(client, received):
+        async for event in summarize_text_events("A short text.", client=client):
+            received.append(event)
+
+    received = []
+    async with fake.client() as client:
+        task = asyncio.create_task(consume(client, received))
+        while not received:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert received[0][0] == "delta"
+    assert fake.streams_closed_early
+
+
+# Test that a reduce round the model does not shrink is redone with brief summaries, keeping every chunk
+@pytest.mark.asyncio
+async def test_summarize_text_non_shrinking_round():
+    def reply(messages):
+        content = messages[-1]["content"]
+        if "at most" in content:
+            return "brief " + " ".join(re.findall(r"Paragraph \d+", content))
+        # Echo the text back: the summary is as long as its input
+        return content.split(": ", 1)[1]
+
+    backend = FakeBackend(reply=reply)
+    text = "\n\n".join(f"Paragraph {i}. " + "Some sentence about the plot. " * 20 for i in range(10))
+    async with LLMClient(backend) as client:
+        summary = await summarize_text(text, client=client, limit=1000)
+    assert all(f"Paragraph {i}" in summary for i in range(10))
+
+
+# Test that a page whose OCR fails keeps its text layer instead of failing the extraction
+def test_extract_text_from_pages_ocr_failure(monkeypatch):
+    class FakePage:
+        def __init__(self, text):
+            self.text = text
+
+        def extract_text(self):
+            return self.text
+
+    class FakeReader:
+        def __init__(self, path):
+            self.pages = [FakePage("Digital page one. " * 5), FakePage("p. 2")]
+
+    def failing_convert_from_path(path, first_page, last_page):
+        raise RuntimeError("poppler not installed")
+
+    monkeypatch.setattr(helper, "PdfReader", FakeReader)
+    monkeypatch.setattr(helper, "convert_from_path", failing_convert_from_path)
+
+    texts = extract_text_from_pages("book.pdf", 1, 2)
+    assert texts[0].startswith("Digital page one.")
+    assert texts[1] == "p. 2"
@@ -0,0 +1,108 @@
+import asyncio
+import ollama
+import pytest
+from app.utils.llm import FakeBackend, LLMClient
+
+MESSAGES = [{"role": "user", "content": "Summarize this text: hello"}]
+
+
+# Fake backend failing its first `failures` calls with `error`
+class FlakyBackend(FakeBackend):
+    def __init__(self, error: Exception, failures: int, latency: float = 0.0):
+        super().__init__(latency=latency)
+        self.error = error
+        self.failures = failures
+
+    async def chat(self, model, messages):
+        if self.calls < self.failures:
+            self.calls += 1
+            raise self.error
+        return await super().chat(model, messages)
+
+
+# Test that transient errors are retried with backoff until the call succeeds
+@pytest.mark.asyncio
+async def test_chat_retries_transient_errors():
+    backend = FlakyBackend(ollama.ResponseError("overloaded", 503), failures=2)
+    client = LLMClient(backend, max_retries=2, backoff=0.01)
+    assert await client.chat("model", MESSAGES) == "Summary of 26 characters."
+    assert backend.calls == 3
+    assert client.stats()["retries"] == 2
+
+
+# Test that client errors are not retried
+@pytest.mark.asyncio
+async def test_chat_does_not_retry_client_errors():
+    backend = FlakyBackend(ollama.ResponseError("model not found", 404), failures=1)
+    client = LLMClient(backend, max_retries=2, backoff=0.01)
+    with pytest.raises(ollama.ResponseError):
+        await client.chat("model", MESSAGES)
+    assert backend.calls == 1
+    assert client.stats()["failures"] == 1
+
+
+# Test that slow calls time out once the retries are used up
+@pytest.mark.asyncio
+async def test_chat_timeout():
+    backend = FakeBackend(latency=1.0)
+    client = LLMClient(backend, timeout=0.05, max_retries=1, backoff=0.01)
+    with pytest.raises(TimeoutError):
+        await client.chat("model", MESSAGES)
+    assert backend.calls == 2
+
+
+# Test that concurrent callers never exceed the client's concurrency limit
+@pytest.mark.asyncio
+async def test_chat_concurrency_limit():
+    active, peak = 0, 0
+
+    class TrackingBackend(FakeBackend):
+        async def chat(self, model, messages):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            try:
+                return await super().chat(model, messages)
+            finally:
+                active -= 1
+
+    client = LLMClient(TrackingBackend(latency=0.02), concurrency=3)
+    await asyncio.gather(*(client.chat("model", MESSAGES) for _ in range(12)))
+    assert peak == 3
+    assert client.stats()["in_flight"] == 0
+
+
+# Test that a stream failing after its first piece is not replayed
+@pytest.mark.asyncio
+async def test_stream_chat_no_retry_after_first_piece():
+    class BrokenStream(FakeBackend):
+        async def stream_chat(self, model, messages):
+            self.calls += 1
+            yield "partial"
+            raise ConnectionError("connection reset")
+
+    backend = BrokenStream()
+    client = LLMClient(backend, max_retries=2, backoff=0.01)
+    pieces = []
+    with pytest.raises(ConnectionError):
+        async for piece in client.stream_chat("model", MESSAGES):
+            pieces.append(piece)
+    assert pieces == ["partial"]
+    assert backend.calls == 1
+
+
+# Test that embedding calls are retried like chat calls
+@pytest.mark.asyncio
+async def test_embed_retries_transient_errors():
+    class FlakyEmbedBackend(FakeBackend):
+        async def embed(self, model, texts):
+            if self.calls == 0:
+                self.calls += 1
+                raise ConnectionError("connection refused")
+            return await super().embed(model, texts)
+
+    backend = FlakyEmbedBackend()
+    client = LLMClient(backend, max_retries=1, backoff=0.01)
+    vectors = await client.embed("embed-model", ["one text"])
+    assert len(vectors) == 1 and len(vectors[0]) == backend.dimensions
+    assert client.stats()["retries"] == 1
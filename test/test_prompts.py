@@ -0,0 +1,61 @@
+from app.utils.prompts import build_recommendation_prompt, review_priority
+from app.utils.telemetry import prompt_tokens
+
+
+def make_reviews(count: int) -> list:
+    return [
+        {"id": i, "book_id": 1000 + i, "review_text": f"Review number {i}. " + "Loved the pacing. " * 30, "rating": float(1 + i % 5)}
+        for i in range(count)
+    ]
+
+
+def make_books(count: int) -> list:
+    return [{"book_id": i, "summary": f"Summary of book {i}. " + "A long tale of storms and harbors. " * 200} for i in range(count)]
+
+
+# Word counting tokenizer, standing in for a real one
+class WordTokenizer:
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return " ".join(text.split()[:max_tokens])
+
+
+# Test that large inputs are cut down to the budget, deterministically
+def test_prompt_fits_budget():
+    reviews, books = make_reviews(500), make_books(50)
+    build = build_recommendation_prompt(reviews, books, budget=2000)
+    assert build.tokens <= 2000
+    assert 0 < build.reviews_used < 500 and 0 < build.books_used < 50
+    assert "…" in build.prompt
+    assert build_recommendation_prompt(list(reversed(reviews)), books, budget=2000).prompt == build.prompt
+
+
+# Test that the most recent and the most extreme reviews are kept first
+def test_review_priority_recent_and_extreme():
+    reviews = [
+        {"id": 1, "book_id": 1, "review_text": "old, loved it", "rating": 5.0},
+        {"id": 2, "book_id": 2, "review_text": "lukewarm", "rating": 3.0},
+        {"id": 3, "book_id": 3, "review_text": "old, hated it", "rating": 1.0},
+        {"id": 4, "book_id": 4, "review_text": "newest, fine", "rating": 3.5},
+    ]
+    assert [review["id"] for review in review_priority(reviews)[:3]] == [4, 3, 1]
+    build = build_recommendation_prompt(reviews, make_books(1), budget=10000)
+    assert build.reviews_used == 4
+
+
+# Test that the best candidate is included even when the budget is tiny
+def test_prompt_keeps_best_candidate():
+    build = build_recommendation_prompt(make_reviews(10), make_books(5), budget=10)
+    assert build.books_used == 1
+    assert "book id 0: summary" in build.prompt
+    assert "book id 1:" not in build.prompt
+
+
+# Test that a pluggable tokenizer drives the budget and that sizes are recorded
+def test_prompt_pluggable_tokenizer():
+    before = prompt_tokens.count("recommendation")
+    build = build_recommendation_prompt(make_reviews(100), make_books(20), budget=1500, tokenizer=WordTokenizer())
+    assert build.tokens == WordTokenizer().count(build.prompt) <= 1500
+    assert prompt_tokens.count("recommendation") == before + 1
@@ -0,0 +1,42 @@
+from starlette.requests import Request
+from app.utils.response_cache import CachedResponse, ResponseCache, cached_json_response, etag_matches, make_etag
+
+
+def request_with(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+# Test If-None-Match parsing: lists, weak validators and "*"
+def test_etag_matches():
+    etag = make_etag("book", 1, 3)
+    assert etag == make_etag("book", 1, 3) != make_etag("book", 1, 4)
+    assert not etag_matches(request_with(), etag)
+    assert etag_matches(request_with(f'"other", {etag}'), etag)
+    assert etag_matches(request_with(f"W/{etag}"), etag)
+    assert etag_matches(request_with("*"), etag)
+
+
+# Test that a response read before an invalidation is not stored after it
+def test_invalidation_discards_in_flight_reads():
+    cache = ResponseCache(maxsize=10, ttl=None)
+    entry = CachedResponse('"v1"', b"{}", {})
+    generation = cache.generation(1)
+    cache.invalidate_book(1)
+    cache.store(("book", 1), entry, book_id=1, generation=generation)
+    assert cache.get(("book", 1)) is None
+
+    cache.store(("book", 1), entry, book_id=1, generation=cache.generation(1))
+    assert cache.get(("book", 1)) == entry
+    cache.invalidate_book(1)
+    assert cache.get(("book", 1)) is None
+
+
+# Test 304 answers and the headers of full responses
+def test_cached_json_response():
+    entry = CachedResponse('"v1"', b"[]", {"X-Next-Cursor": "5"})
+    response = cached_json_response(request_with('"v1"'), entry)
+    assert response.status_code == 304 and response.body == b""
+    response = cached_json_response(request_with('"v0"'), entry)
+    assert response.status_code == 200 and response.body == b"[]"
+    assert response.headers["etag"] == '"v1"' and response.headers["x-next-cursor"] == "5"
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+import app.db as db
+from app.models import Book
+from app.utils.catalog import bump_stored_catalog_revision
+from app.utils.search import InvertedIndex, tokenize
+
+
+def book(id, title, author="", genre="", summary=""):
+    return SimpleNamespace(id=id, title=title, author=author, genre=genre, summary=summary)
+
+
+# Test tokenization lowercases and drops stopwords
+def test_tokenize():
+    assert tokenize("The Lord of the Rings, Vol. 2") == ["lord", "rings", "vol", "2"]
+    assert tokenize(None) == []
+
+
+# Test that every query term must match and title matches outrank summary matches
+def test_inverted_index_ranking():
+    index = InvertedIndex()
+    index.rebuild([
+        book(1, "Cooking", summary="a dragon eats magic soup"),
+        book(2, "Dragon Magic", genre="Fantasy"),
+        book(3, "Space Lasers", author="Bob Dragon"),
+    ])
+    assert [book_id for book_id, _ in index.search("dragon magic")] == [2, 1]
+    assert [book_id for book_id, _ in index.search("dragon", k=2)] == [2, 3]
+    assert index.search("dragon unicorn") == []
+    assert index.search("the") == []
+
+
+# Test that upserts and removals keep the postings current
+def test_inverted_index_updates():
+    index = InvertedIndex()
+    index.upsert(book(1, "Ignored"))  # not loaded yet: picked up by the first rebuild instead
+    assert len(index) == 0
+    index.rebuild([book(1, "Dragon Magic")])
+    index.upsert(book(1, "Unicorns"))
+    index.upsert(book(2, "Dragon Tales"))
+    assert [book_id for book_id, _ in index.search("dragon")] == [2]
+    assert [book_id for book_id, _ in index.search("unicorns")] == [1]
+    index.remove(2)
+    assert index.search("dragon") == []
+    assert "dragon" not in index.postings
+
+
+# Test that books written outside this worker (stored revision bumped) are picked up on next use
+@pytest.mark.asyncio
+async def test_inverted_index_follows_stored_revision(tmp_path):
+    engine = db.create_engine(f"sqlite+aiosqlite:///{tmp_path}/catalog.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    index = InvertedIndex()
+    try:
+        async with Session() as session:
+            session.add(Book(id=1, title="Dragon Magic", author="A", genre="G"))
+            await session.commit()
+            await index.ensure_loaded(session)
+            assert [book_id for book_id, _ in index.search("dragon")] == [1]
+
+            # e.g. the bulk import command line, which only bumps the stored revision
+            session.add(Book(id=2, title="Dragon Tales", author="B", genre="G"))
+            await bump_stored_catalog_revision(session)
+            await session.commit()
+            await index.ensure_loaded(session)
+        assert sorted(book_id for book_id, _ in index.search("dragon")) == [1, 2]
+    finally:
+        await engine.dispose()
@@ -1,3 +1,7 @@
+import asyncio
+import base64
+import json
+import os
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
@@ -6,7 +10,18 @@ from main import app
 from app.db import Base, engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.models import User
+from datetime import datetime, timedelta
+from app.models import User, Token
+from app.utils import auth
+from app.utils.auth import token_cache, purge_expired_tokens
+from app.utils.password import password_hasher
+from app.utils.catalog import bump_catalog_revision, bump_stored_catalog_revision
+from app.utils.recommendations import cached_recommendations
+from app.utils import summary_jobs
+from app.utils.cache import TTLCache
+from app.utils.llm import FakeBackend, LLMClient, set_llm_client
+from app.utils.summary_cache import DiskCache
+from app.routes import books as books_routes
 
 # Database setup and teardown fixture
 @pytest_asyncio.fixture(scope="function", autouse=True)
@@ -63,6 +78,68 @@ async def test_login_user(async_client):
     assert "access_token" in data
     assert data["token_type"] == "bearer"
 
+# Test that password hashing runs on the password pool
+@pytest.mark.asyncio
+async def test_password_work_uses_pool(async_client):
+    completed_before = password_hasher.completed
+    payload = {"email": "testuser81@example.com", "password": "securepassword"}
+    await async_client.post("/register", json=payload)
+    response = await async_client.post("/login", json=payload)
+    assert response.status_code == 200
+    assert password_hasher.completed == completed_before + 2
+    assert password_hasher.stats()["in_flight"] == 0
+
+# Test for cached token verification and revocation on logout
+@pytest.mark.asyncio
+async def test_logout_revokes_cached_token(async_client: AsyncClient, auth_headers):
+    hits_before = token_cache.hits
+    response = await async_client.get("/books/", headers=auth_headers)
+    assert response.status_code == 200
+    response = await async_client.get("/books/", headers=auth_headers)
+    assert response.status_code == 200
+    assert token_cache.hits > hits_before
+
+    response = await async_client.post("/logout", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = await async_client.get("/books/", headers=auth_headers)
+    assert response.status_code in (401, 403)
+
+# Test for stateless tokens: no tokens table rows, revocation through the jti denylist
+@pytest.mark.asyncio
+async def test_stateless_auth_mode(async_client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_MODE", "stateless")
+    payload = {"email": "stateless@example.com", "password": "securepassword"}
+    await async_client.post("/register", json=payload)
+    response = await async_client.post("/login", json=payload)
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async with AsyncSession(engine) as session:
+        assert (await session.execute(select(Token))).scalars().all() == []
+
+    response = await async_client.get("/books/", headers=headers)
+    assert response.status_code == 200
+    response = await async_client.post("/logout", headers=headers)
+    assert response.status_code == 200
+    response = await async_client.get("/books/", headers=headers)
+    assert response.status_code == 401
+
+# Test for purging expired token rows in batches
+@pytest.mark.asyncio
+async def test_purge_expired_tokens(async_client: AsyncClient, auth_headers):
+    async with AsyncSession(engine) as session:
+        user = (await session.execute(select(User))).scalars().first()
+        past = datetime.utcnow() - timedelta(minutes=1)
+        session.add_all([Token(token=f"expired-{i}", user_id=user.id, expires_at=past) for i in range(5)])
+        await session.commit()
+
+        assert await purge_expired_tokens(session, batch_size=2) == 5
+        remaining = (await session.execute(select(Token))).scalars().all()
+        assert len(remaining) == 1
+
+    response = await async_client.get("/books/", headers=auth_headers)
+    assert response.status_code == 200
+
 # Test for creating a book
 @pytest.mark.asyncio
 async def test_create_book(async_client: AsyncClient, auth_headers):
@@ -86,6 +163,122 @@ async def test_get_books(async_client: AsyncClient, auth_headers):
     data = response.json()
     assert isinstance(data, list)
 
+# Test for paginating books with the keyset cursor
+@pytest.mark.asyncio
+async def test_get_books_pagination(async_client: AsyncClient, auth_headers):
+    for i in range(3):
+        payload = {
+            "title": f"Book {i}",
+            "author": "John Doe",
+            "genre": "Fiction",
+            "year_published": 2021,
+            "summary": "A brief summary of the book"
+        }
+        await async_client.post("/books/", json=payload, headers=auth_headers)
+
+    response = await async_client.get("/books/?limit=2", headers=auth_headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers["X-Next-Cursor"]
+    assert cursor == str(first_page[-1]["id"])
+
+    response = await async_client.get(f"/books/?limit=2&after={cursor}&include_summary=false", headers=auth_headers)
+    assert response.status_code == 200
+    second_page = response.json()
+    assert len(second_page) == 1
+    assert second_page[0]["summary"] is None
+    assert "X-Next-Cursor" not in response.headers
+
+# Test for streaming books as NDJSON
+@pytest.mark.asyncio
+async def test_get_books_stream(async_client: AsyncClient, auth_headers):
+    payload = {
+        "title": "New Book",
+        "author": "John Doe",
+        "genre": "Fiction",
+        "year_published": 2021,
+        "summary": "A brief summary of the book"
+    }
+    await async_client.post("/books/", json=payload, headers=auth_headers)
+
+    response = await async_client.get("/books/?stream=true", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines() if line]
+    assert rows[0]["title"] == payload["title"]
+
+# Test for bulk importing books from NDJSON with per-batch errors
+@pytest.mark.asyncio
+async def test_bulk_import_ndjson(async_client: AsyncClient, auth_headers):
+    records = [
+        {"title": f"Imported {i}", "author": "John Doe", "genre": "Fiction", "year_published": 2000 + i}
+        for i in range(5)
+    ]
+    body = "\n".join(json.dumps(record) for record in records) + "\n{not json}\n" + json.dumps({"title": "Missing fields"})
+    response = await async_client.post("/books/import?batch_size=2", content=body, headers=auth_headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 5
+    assert report["failed"] == 2
+    error_lines = [error["line"] for batch in report["batches"] for error in batch["errors"]]
+    assert error_lines == [6, 7]
+
+# Test for bulk importing books from CSV
+@pytest.mark.asyncio
+async def test_bulk_import_csv(async_client: AsyncClient, auth_headers):
+    body = "title,author,genre,year_published,summary\nCSV Book,John Doe,Fiction,2021,\"Short, sweet\"\n"
+    response = await async_client.post("/books/import", content=body, headers={**auth_headers, "content-type": "text/csv"})
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 1
+
+    response = await async_client.get("/books/", headers=auth_headers)
+    assert response.json()[0]["summary"] == "Short, sweet"
+
+# Test that quoted CSV fields may span lines and that error lines count physical lines
+@pytest.mark.asyncio
+async def test_bulk_import_csv_multiline(async_client: AsyncClient, auth_headers):
+    body = (
+        'title,author,genre,year_published,summary\n'
+        '"A","B","C",2000,"line one\nline two"\n'
+        'Short,row\n'
+    )
+    response = await async_client.post("/books/import", content=body, headers={**auth_headers, "content-type": "text/csv"})
+    report = response.json()
+    assert report["inserted"] == 1
+    assert [error["line"] for error in report["batches"][0]["errors"]] == [4]
+
+    response = await async_client.get("/books/", headers=auth_headers)
+    assert response.json()[0]["summary"] == "line one\nline two"
+
+# Test that lines that are not valid UTF-8 are reported per line instead of failing the import
+@pytest.mark.asyncio
+async def test_bulk_import_invalid_utf8(async_client: AsyncClient, auth_headers):
+    record = json.dumps({"title": "Valid", "author": "A", "genre": "G", "year_published": 2000}).encode()
+    body = b"\xef\xbb\xbf" + record + b"\n{\"title\": \"\xff\xfe\"}\n" + record
+    response = await async_client.post("/books/import", content=body, headers=auth_headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["batches"][0]["errors"] == [{"line": 2, "error": "invalid UTF-8"}]
+
+    body = b"title,author,genre,year_published\nBad \xff,A,G,2000\nGood,A,G,2000\nShort,row\n"
+    response = await async_client.post("/books/import", content=body, headers={**auth_headers, "content-type": "text/csv"})
+    report = response.json()
+    assert report["inserted"] == 1
+    assert [error["line"] for error in report["batches"][0]["errors"]] == [2, 4]
+
+# Test that a batch larger than the database's bind parameter limit still imports
+@pytest.mark.asyncio
+async def test_bulk_import_large_batch(async_client: AsyncClient, auth_headers):
+    body = "\n".join(
+        json.dumps({"title": f"Bulk {i}", "author": "A", "genre": "G", "year_published": 2000, "summary": "S"})
+        for i in range(10000)
+    )
+    response = await async_client.post("/books/import?batch_size=10000", content=body, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 10000
+
 # Test for retrieving a single book by ID
 @pytest.mark.asyncio
 async def test_get_book(async_client: AsyncClient, auth_headers):
@@ -106,6 +299,140 @@ async def test_get_book(async_client: AsyncClient, auth_headers):
     data = response.json()
     assert data["id"] == book_id
 
+# Test for ETag revalidation of book reads and invalidation by writes
+@pytest.mark.asyncio
+async def test_book_etags(async_client: AsyncClient, auth_headers):
+    payload = {"title": "Cached", "author": "A", "genre": "G", "year_published": 2000, "summary": "S"}
+    book_id = (await async_client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+
+    for path in (f"/books/{book_id}", f"/books/{book_id}/summary", "/books/"):
+        response = await async_client.get(path, headers=auth_headers)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        response = await async_client.get(path, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+
+    response = await async_client.get(f"/books/{book_id}/summary", headers=auth_headers)
+    summary_etag = response.headers["ETag"]
+    await async_client.post("/books/reviews", json={"book_id": book_id, "review_text": "R", "rating": 4}, headers=auth_headers)
+    response = await async_client.get(f"/books/{book_id}/summary", headers={**auth_headers, "If-None-Match": summary_etag})
+    assert response.status_code == 200
+    assert response.json()["review_count"] == 1
+
+    response = await async_client.get(f"/books/{book_id}", headers=auth_headers)
+    book_etag = response.headers["ETag"]
+    await async_client.put(f"/books/{book_id}", json={"title": "Renamed"}, headers=auth_headers)
+    response = await async_client.get(f"/books/{book_id}", headers={**auth_headers, "If-None-Match": book_etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Renamed"
+
+    response = await async_client.get("/metrics/cache")
+    assert response.json()["responses"]["not_modified"] >= 3
+
+# Test that the listing ETag depends on the listing itself, not on this process's revision counter
+@pytest.mark.asyncio
+async def test_book_listing_etag_is_content_based(async_client: AsyncClient, auth_headers):
+    payload = {"title": "Listed", "author": "A", "genre": "G", "year_published": 2000, "summary": "S"}
+    await async_client.post("/books/", json=payload, headers=auth_headers)
+    etag = (await async_client.get("/books/", headers=auth_headers)).headers["ETag"]
+
+    # Another worker (or this one after a restart) has its own counter and an empty cache
+    bump_catalog_revision()
+    response = await async_client.get("/books/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    await async_client.post("/books/", json={**payload, "title": "Another"}, headers=auth_headers)
+    response = await async_client.get("/books/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+# Test for the Prometheus metrics endpoint
+@pytest.mark.asyncio
+async def test_metrics_endpoint(async_client: AsyncClient, auth_headers):
+    await async_client.get("/books/", headers=auth_headers)
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/books/",status="200"}' in response.text
+    assert 'http_request_component_seconds_count{route="/books/",component="db"}' in response.text
+    assert 'cache_hits_total{cache="tokens"}' in response.text
+
+# Test for filtering the book listing and counting facets
+@pytest.mark.asyncio
+async def test_filter_books_and_facets(async_client: AsyncClient, auth_headers):
+    books = [("A", "Fantasy", "X", 1995), ("B", "Fantasy", "Y", 2001), ("C", "SciFi", "X", 1999), ("D", "Poetry", "Z", 2010)]
+    ids = []
+    for title, genre, author, year in books:
+        payload = {"title": title, "author": author, "genre": genre, "year_published": year, "summary": "S"}
+        ids.append((await async_client.post("/books/", json=payload, headers=auth_headers)).json()["id"])
+    for book_id, rating in zip(ids, (5, 2, 4)):
+        await async_client.post("/books/reviews", json={"book_id": book_id, "review_text": "R", "rating": rating}, headers=auth_headers)
+
+    async def titles(**params):
+        response = await async_client.get("/books/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        return [book["title"] for book in response.json()]
+
+    assert await titles(genre="Fantasy") == ["A", "B"]
+    assert await titles(author="X") == ["A", "C"]
+    assert await titles(year_from=1996, year_to=2005) == ["B", "C"]
+    assert await titles(min_rating=3.5) == ["A", "C"]
+
+    response = await async_client.get("/books/facets", headers=auth_headers)
+    assert response.status_code == 200
+    facets = response.json()
+    assert facets["genres"][0] == {"value": "Fantasy", "count": 2}
+    assert {facet["value"]: facet["count"] for facet in facets["decades"]} == {1990: 2, 2000: 1, 2010: 1}
+
+    payload = {"title": "E", "author": "Q", "genre": "SciFi", "year_published": 1990, "summary": "S"}
+    await async_client.post("/books/", json=payload, headers=auth_headers)
+    facets = (await async_client.get("/books/facets", headers=auth_headers)).json()
+    assert {facet["value"]: facet["count"] for facet in facets["genres"]} == {"Fantasy": 2, "SciFi": 2, "Poetry": 1}
+
+# Test for ranked, paginated full-text search
+@pytest.mark.asyncio
+async def test_search_books(async_client: AsyncClient, auth_headers):
+    books = [
+        {"title": "Dragon Magic", "author": "Ann Lee", "genre": "Fantasy", "year_published": 2001, "summary": "Wizards and spells"},
+        {"title": "Space Lasers", "author": "Bob Stone", "genre": "Science Fiction", "year_published": 1999, "summary": "Galaxy battles"},
+        {"title": "Cooking", "author": "Chef", "genre": "Food", "year_published": 2010, "summary": "A dragon eats magic soup"},
+    ]
+    for book in books:
+        await async_client.post("/books/", json=book, headers=auth_headers)
+
+    response = await async_client.get("/books/search", params={"q": "dragon magic", "limit": 1}, headers=auth_headers)
+    assert response.status_code == 200
+    assert [book["title"] for book in response.json()] == ["Dragon Magic"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await async_client.get("/books/search", params={"q": "dragon magic", "limit": 1, "cursor": cursor}, headers=auth_headers)
+    assert [book["title"] for book in response.json()] == ["Cooking"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = await async_client.get("/books/search", params={"q": "galaxy"}, headers=auth_headers)
+    assert [book["title"] for book in response.json()] == ["Space Lasers"]
+
+# Test for fetching many books by id in one request
+@pytest.mark.asyncio
+async def test_get_books_by_ids(async_client: AsyncClient, auth_headers):
+    book_ids = []
+    for i in range(2):
+        payload = {
+            "title": f"Book {i}",
+            "author": "John Doe",
+            "genre": "Fiction",
+            "year_published": 2021,
+        }
+        response = await async_client.post("/books/", json=payload, headers=auth_headers)
+        book_ids.append(response.json()["id"])
+
+    missing_id = max(book_ids) + 1000
+    ids = f"{book_ids[1]},{missing_id},{book_ids[0]}"
+    response = await async_client.get(f"/books?ids={ids}", headers=auth_headers)
+    assert response.status_code == 200
+    assert [book["id"] for book in response.json()] == [book_ids[1], book_ids[0]]
+    assert response.headers["X-Missing-Ids"] == str(missing_id)
+
 # Test for updating a book
 @pytest.mark.asyncio
 async def test_update_book(async_client: AsyncClient, auth_headers):
@@ -168,6 +495,28 @@ async def test_get_summary(async_client: AsyncClient, auth_headers):
     assert data["summary"] == payload["summary"]
     assert data["average_rating"] is None
 
+# Test for the aggregated rating once reviews exist
+@pytest.mark.asyncio
+async def test_get_summary_with_reviews(async_client: AsyncClient, auth_headers):
+    payload = {
+        "title": "New Book",
+        "author": "John Doe",
+        "genre": "Fiction",
+        "year_published": 2021,
+        "summary": "A brief summary of the book"
+    }
+    response = await async_client.post("/books/", json=payload, headers=auth_headers)
+    book_id = response.json()["id"]
+    for rating in (3, 5):
+        review_payload = {"review_text": "Good", "rating": rating, "book_id": book_id}
+        await async_client.post("/books/reviews", json=review_payload, headers=auth_headers)
+
+    response = await async_client.get(f"/books/{book_id}/summary", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["average_rating"] == 4
+    assert data["review_count"] == 2
+
 # Test for adding a review to a book
 @pytest.mark.asyncio
 async def test_add_review(async_client: AsyncClient, auth_headers):
@@ -196,6 +545,33 @@ async def test_add_review(async_client: AsyncClient, auth_headers):
     assert data["rating"] == review_payload["rating"]
     assert data["book_id"] == book_id
 
+# Test for submitting a batch of reviews with per-item errors
+@pytest.mark.asyncio
+async def test_add_reviews_batch(async_client: AsyncClient, auth_headers):
+    book_payload = {
+        "title": "New Book",
+        "author": "John Doe",
+        "genre": "Fiction",
+        "year_published": 2021,
+        "summary": "A brief summary of the book"
+    }
+    book_response = await async_client.post("/books/", json=book_payload, headers=auth_headers)
+    book_id = book_response.json()["id"]
+
+    batch = [
+        {"review_text": "Great book!", "rating": 5, "book_id": book_id},
+        {"review_text": "Unknown book", "rating": 1, "book_id": book_id + 1000},
+        {"review_text": "Pretty good", "rating": 3, "book_id": book_id},
+    ]
+    response = await async_client.post("/books/reviews/batch", json=batch, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [review["review_text"] for review in data["created"]] == ["Great book!", "Pretty good"]
+    assert data["errors"] == [{"index": 1, "book_id": book_id + 1000, "detail": "Book not found"}]
+
+    response = await async_client.get(f"/books/{book_id}/summary", headers=auth_headers)
+    assert response.json()["average_rating"] == 4
+
 # Test for retrieving all reviews for a book
 @pytest.mark.asyncio
 async def test_get_reviews(async_client: AsyncClient, auth_headers):
@@ -231,6 +607,43 @@ async def test_get_reviews(async_client: AsyncClient, auth_headers):
     assert data[0]["rating"] == review_payload["rating"]
     assert data[0]["book_id"] == book_id
 
+# Test for paging through reviews with each sort order
+@pytest.mark.asyncio
+async def test_get_reviews_pagination(async_client: AsyncClient, auth_headers):
+    book_payload = {"title": "Paged", "author": "A", "genre": "G", "year_published": 2020, "summary": "S"}
+    book_id = (await async_client.post("/books/", json=book_payload, headers=auth_headers)).json()["id"]
+    ratings = [3, 5, 1, 5, 4]
+    for i, rating in enumerate(ratings):
+        review_payload = {"review_text": f"Review {i}", "rating": rating, "book_id": book_id}
+        await async_client.post("/books/reviews", json=review_payload, headers=auth_headers)
+
+    async def collect(sort: str) -> list:
+        texts, cursor = [], None
+        while True:
+            params = {"limit": 2, "sort": sort, **({"cursor": cursor} if cursor else {})}
+            response = await async_client.get(f"/books/{book_id}/reviews", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            texts += [review["review_text"] for review in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return texts
+
+    assert await collect("oldest") == [f"Review {i}" for i in range(5)]
+    assert await collect("recent") == [f"Review {i}" for i in reversed(range(5))]
+    assert await collect("rating") == ["Review 3", "Review 1", "Review 4", "Review 0", "Review 2"]
+
+    response = await async_client.get(f"/books/{book_id}/reviews", params={"limit": 2, "sort": "recent"}, headers=auth_headers)
+    cursor = response.headers["X-Next-Cursor"]
+    response = await async_client.get(f"/books/{book_id}/reviews", params={"sort": "rating", "cursor": cursor}, headers=auth_headers)
+    assert response.status_code == 400
+
+    # Cursors whose key has the wrong types are rejected rather than reaching the query
+    for key in (["oldest", "1"], ["oldest", True], ["rating", "5", 1], ["rating", 5.0, [1]], "oldest"):
+        cursor = base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+        sort = key[0] if isinstance(key, list) else key
+        response = await async_client.get(f"/books/{book_id}/reviews", params={"sort": sort, "cursor": cursor}, headers=auth_headers)
+        assert response.status_code == 400
+
 
 # Test for generating summary from PDF
 @pytest.mark.asyncio
@@ -238,14 +651,125 @@ async def test_generate_summary(async_client: AsyncClient, auth_headers):
     file_path = r"Books\rider5.pdf"
     with open(file_path, "rb") as file:
         response = await async_client.post("/generate-summary", files={"file": ("file.pdf", file)}, headers=auth_headers)
-    assert response.status_code == 200
-    data = response.json()
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    # Poll the job until the background pipeline finishes
+    for _ in range(600):
+        response = await async_client.get(f"/generate-summary/{job_id}", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        if data["status"] in ("done", "failed"):
+            break
+        await asyncio.sleep(0.5)
+    assert data["status"] == "done"
     assert "final_summary" in data
 
+# Test for rejecting non-PDF uploads
+@pytest.mark.asyncio
+async def test_generate_summary_rejects_non_pdf(async_client: AsyncClient, auth_headers):
+    response = await async_client.post("/generate-summary", files={"file": ("notes.txt", b"plain text")}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+# Fake LLM and an empty summary cache for the summary stream tests
+@pytest.fixture
+def fake_summary_llm(tmp_path, monkeypatch):
+    monkeypatch.setattr(summary_jobs, "summary_cache", DiskCache(str(tmp_path / "summary-cache"), 1024 * 1024))
+    uploads = []
+
+    async def recording_save_upload(file):
+        saved = await summary_jobs.save_upload(file)
+        uploads.append(saved[0])
+        return saved
+
+    monkeypatch.setattr(books_routes, "save_upload", recording_save_upload)
+    set_llm_client(LLMClient(FakeBackend()))
+    yield uploads
+    set_llm_client(None)
+
+def sse_events(body: str) -> list:
+    """(event, data) pairs of a text/event-stream body."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+# Test for streaming a summary as Server-Sent Events
+@pytest.mark.asyncio
+async def test_generate_summary_stream(async_client: AsyncClient, auth_headers, fake_summary_llm):
+    with open(os.path.join("Books", "rider5.pdf"), "rb") as file:
+        response = await async_client.post("/generate-summary/stream", files={"file": ("file.pdf", file)}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert events[0] == ("status", {"status": "extracting"})
+    assert "delta" in [event for event, _ in events]
+    assert events[-1][0] == "final" and events[-1][1]["summary"]
+    assert not os.path.exists(fake_summary_llm[0])
+
+# Test that a failing summary stream ends with an error event and still removes the upload
+@pytest.mark.asyncio
+async def test_generate_summary_stream_error(async_client: AsyncClient, auth_headers, fake_summary_llm):
+    response = await async_client.post("/generate-summary/stream", files={"file": ("file.pdf", b"not a pdf")}, headers=auth_headers)
+    assert response.status_code == 200
+    event, data = sse_events(response.text)[-1]
+    assert event == "error" and data["detail"]
+    assert not os.path.exists(fake_summary_llm[0])
+
+# Test that a finished job stays available for the retention period even if it ran longer than that
+@pytest.mark.asyncio
+async def test_summary_job_retention_starts_when_finished(fake_summary_llm, tmp_path, monkeypatch):
+    monkeypatch.setattr(summary_jobs, "jobs", TTLCache(maxsize=10, ttl=0.2))
+
+    async def slow_document_text(pdf_file_path, file_digest):
+        await asyncio.sleep(0.3)
+        return "Some text about dragons."
+
+    monkeypatch.setattr(summary_jobs, "document_text", slow_document_text)
+    pdf_file_path = tmp_path / "upload.pdf"
+    pdf_file_path.write_bytes(b"%PDF")
+    job = await summary_jobs.submit_summary_job(str(pdf_file_path), "digest", user_id=1)
+    await asyncio.gather(*summary_jobs._running_tasks)
+    assert summary_jobs.jobs.get(job["job_id"])["status"] == "done"
+
+# Test for rejecting non-PDF uploads on the summary stream
+@pytest.mark.asyncio
+async def test_generate_summary_stream_rejects_non_pdf(async_client: AsyncClient, auth_headers, fake_summary_llm):
+    response = await async_client.post("/generate-summary/stream", files={"file": ("notes.txt", b"plain text")}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "error" in response.json()
+    assert fake_summary_llm == []
+
 # Test for getting book recommendations
 @pytest.mark.asyncio
 async def test_get_recommendations(async_client: AsyncClient, auth_headers):
     response = await async_client.get("/recommendations", headers=auth_headers)
     assert response.status_code == 200
     data = response.json()
-    assert isinstance(data, list)
\ No newline at end of file
+    assert isinstance(data, list)
+
+# Test that recommendations are cached until the stored catalog revision changes
+@pytest.mark.asyncio
+async def test_recommendations_cached_until_stamp_changes():
+    calls = []
+
+    async def compute(db, user_id):
+        calls.append(user_id)
+        return [{"book_id": len(calls), "summary": None, "recommendation": "cached"}]
+
+    async with AsyncSession(engine) as session:
+        first = await cached_recommendations(session, 4242, compute)
+        second = await cached_recommendations(session, 4242, compute)
+        assert first == second
+        assert len(calls) == 1
+
+        await bump_stored_catalog_revision(session)
+        await session.commit()
+        stale = await cached_recommendations(session, 4242, compute, stale_while_revalidate=True)
+        assert stale == first  # served from cache, refreshed in the background
+        await asyncio.sleep(0.1)
+        fresh = await cached_recommendations(session, 4242, compute)
+        assert fresh != first
+        assert len(calls) == 2
@@ -0,0 +1,72 @@
+import asyncio
+import httpx
+import jwt
+import pytest
+from fastapi import FastAPI
+from app.utils import auth
+from app.utils.telemetry import Histogram, TimingMiddleware, record, request_component_duration, request_duration, request_timings, timed
+
+
+# Test cumulative buckets, sum and count in the Prometheus text output
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/a")
+    text = histogram.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{route="/a"} 3' in text
+    assert histogram.count("/a") == 3
+
+
+# Test that component time is attributed to the request and reported in Server-Timing
+@pytest.mark.asyncio
+async def test_timing_middleware():
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware, server_timing_header=True)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        with timed("llm"):
+            pass
+        record("db", 0.002)
+        return {"id": item_id}
+
+    before = request_duration.count("GET", "/items/{item_id}", "200")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/items/7")
+        missing = await client.get("/missing")
+
+    assert response.status_code == 200 and missing.status_code == 404
+    server_timing = response.headers["server-timing"]
+    assert server_timing.startswith("total;dur=") and "db;dur=2.0" in server_timing and "llm;dur=" in server_timing
+    assert request_duration.count("GET", "/items/{item_id}", "200") == before + 1
+    assert request_duration.count("GET", "unmatched", "404") >= 1
+    assert request_component_duration.count("/items/{item_id}", "db") >= 1
+
+
+# Test that only the JWT decode is timed as auth, not the token table lookup
+@pytest.mark.asyncio
+async def test_auth_timing_excludes_token_lookup(monkeypatch):
+    class SlowTokenTable:
+        async def execute(self, query):
+            await asyncio.sleep(0.05)
+
+            class Result:
+                def scalar_one_or_none(self):
+                    return 1
+
+            return Result()
+
+    monkeypatch.setattr(auth, "AUTH_MODE", "stateful")
+    token = jwt.encode({"sub": "7"}, auth.secret_key, algorithm=auth.algorithm)
+    timings = {}
+    context = request_timings.set(timings)
+    try:
+        assert await auth.JWTBearer().verify_jwt(token, SlowTokenTable()) == 7
+    finally:
+        request_timings.reset(context)
+        auth.invalidate_token(token)
+    assert 0 < timings["auth"] < 0.05